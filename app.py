@@ -2,12 +2,13 @@ import os
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
 
-from flask import Flask, request, jsonify, render_template
-from chatbot.intent_handler import IntentHandler
-from chatbot.caching import EmbeddingCache
-from chatbot.knowledge import KnowledgeBase
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+from chatbot.flow_store import MemoryFlowStore, SQLiteFlowStore
+from chatbot.startup import ComponentRegistry
+from scripts.server_health_check import MetricsHistory, MetricsSampler
+import json
+import threading
 import uuid
-from chatbot.nl_generation import ResponseGenerator
 import cProfile
 import pstats
 import io
@@ -15,37 +16,256 @@ import time  # Import time for simple timing
 
 app = Flask(__name__)
 app.config['TIMEOUT'] = 300
-cache = EmbeddingCache()
-kb = KnowledgeBase()
-response_generator = ResponseGenerator()
-handler = IntentHandler(cache, kb, response_generator)
+
+# Model modules (torch, transformers, langchain) are imported inside the factories:
+# spawned ingestion and script workers re-import this module and must stay light
+
+def _build_cache():
+    from chatbot.caching import EmbeddingCache
+    return EmbeddingCache()
+
+def _build_generator():
+    from chatbot.nl_generation import ResponseGenerator
+    return ResponseGenerator(quantize=os.environ.get('GENERATOR_QUANTIZE') == '1')
+
+def _build_flow_store():
+    # A shared SQLite file lets every Gunicorn worker continue a session's flow
+    ttl = float(os.environ.get('FLOW_SESSION_TTL', 1800))
+    path = os.environ.get('FLOW_STORE_PATH')
+    return SQLiteFlowStore(path, ttl=ttl) if path else MemoryFlowStore(ttl=ttl)
+
+def _build_kb(cache):
+    from chatbot.knowledge import KnowledgeBase
+    kb = KnowledgeBase(cache)
+    kb.start_watcher(interval=float(os.environ.get('KB_WATCH_INTERVAL', 30)))
+    return kb
+
+def _build_handler(cache):
+    from chatbot.intent_handler import IntentHandler
+    # Script mode is served before the generator is ready, so its proxy never blocks;
+    # kb mode is only served once the generator is loaded
+    return IntentHandler(
+        cache, components.proxy('kb'), components.proxy('generator', timeout=0), flow_store=_build_flow_store()
+    )
+
+# Heavy components load in parallel in the background once start() runs
+components = ComponentRegistry()
+components.register('cache', _build_cache)
+components.register('generator', _build_generator)
+components.register('kb', _build_kb, requires=('cache',))
+components.register('handler', _build_handler, requires=('cache',))
+# Host metrics history: a constant-memory ring buffer fed by a background sampler
+metrics_history = MetricsHistory(capacity=int(os.environ.get('METRICS_HISTORY_SIZE', 4320)))
+metrics_sampler = MetricsSampler(
+    interval=float(os.environ.get('METRICS_SAMPLE_INTERVAL', 5)), history=metrics_history,
+    disk_scan_interval=float(os.environ.get('METRICS_DISK_SCAN_INTERVAL', 300))
+)
+
+_started = False
+_start_lock = threading.Lock()
+
+def start():
+    """Start component loading and metrics sampling once per serving process.
+
+    Nothing starts at import time, because worker processes re-import this
+    module. `python app.py` calls this before serving; under another WSGI
+    server call it from a worker hook (e.g. Gunicorn's post_worker_init), or
+    the first request does.
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    components.start()
+    metrics_sampler.start()
+
+@app.before_request
+def _ensure_started():
+    start()
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    ready = components.is_ready('handler', 'kb', 'generator')
+    return jsonify({
+        'ready': ready,
+        'modes': {
+            'script': components.is_ready('handler'),
+            'kb': components.is_ready('handler', 'kb', 'generator')
+        },
+        'components': components.status()
+    }), 200 if ready else 503
+
+@app.route('/api/metrics')
+def metrics():
+    """Host metrics history, downsampled to at most `points` samples over `window` seconds"""
+    window = request.args.get('window', 3600, type=float)
+    points = max(1, min(request.args.get('points', 300, type=int), 5000))
+    return jsonify({
+        'window': window,
+        'interval': metrics_sampler.interval,
+        **metrics_history.query(window=window, max_points=points),
+        'connectivity': metrics_sampler.prober.stats()
+    })
+
+@app.route('/api/metrics/latest')
+def metrics_latest():
+    """Most recent sampler snapshot; the health-check script reports from it"""
+    snapshot = metrics_sampler.snapshot()
+    return jsonify(snapshot), 200 if snapshot else 503
+
+@app.route('/api/network')
+def network():
+    """Connection-table aggregates from the latest sample, optionally narrowed to one `status`"""
+    return jsonify(metrics_sampler.connections.aggregates(status=request.args.get('status')))
+
 @app.route('/api/chat', methods=['POST'])
 def handle_chat():
     data = request.json
     session_id = data.get('session_id', str(uuid.uuid4()))
+    mode = data.get('mode', 'script')
+
+    # Script mode only needs the intent encoder; kb mode also needs retrieval and generation
+    required = ('handler', 'kb', 'generator') if mode == 'kb' else ('handler',)
+    if not components.is_ready(*required):
+        return jsonify({
+            'response': 'The assistant is still starting up. Please try again shortly.',
+            'type': 'loading',
+            'session_id': session_id,
+            'components': components.status()
+        }), 503
 
-    response, resp_type = handler.handle_query(
+    handler = components.get('handler')
+    response, resp_type, *extra = handler.handle_query(
         query=data['message'],
         session_id=session_id,
-        mode=data.get('mode', 'script')
+        mode=mode
     )
 
     return jsonify({
         'response': response,
         'type': resp_type,
-        'session_id': session_id
+        'session_id': session_id,
+        **(extra[0] if extra else {})
     })
 
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def handle_chat_stream():
+    """Server-Sent Events variant of /api/chat: sources first, then generated text as it arrives"""
+    data = request.json
+    session_id = data.get('session_id', str(uuid.uuid4()))
+    mode = data.get('mode', 'script')
+
+    required = ('handler', 'kb', 'generator') if mode == 'kb' else ('handler',)
+    if not components.is_ready(*required):
+        return jsonify({
+            'response': 'The assistant is still starting up. Please try again shortly.',
+            'type': 'loading',
+            'session_id': session_id,
+            'components': components.status()
+        }), 503
+
+    def events():
+        if mode != 'kb':
+            response, resp_type, *extra = components.get('handler').handle_query(
+                query=data['message'], session_id=session_id, mode=mode
+            )
+            yield _sse('done', {'response': response, 'type': resp_type, 'session_id': session_id,
+                                **(extra[0] if extra else {})})
+            return
+
+        handler = components.get('handler')
+        generator = components.get('generator')
+        rag_results = components.get('kb').search(data['message'])
+        yield _sse('sources', {'sources': [
+            {'source': r['source'], 'page': r['page']} for r in rag_results
+        ], 'session_id': session_id})
+        if not rag_results:
+            yield _sse('done', {'response': 'No relevant documentation found. Try rephrasing.',
+                                'type': 'knowledge', 'session_id': session_id})
+            return
+
+        cached = handler.lookup_kb_answer(data['message'], rag_results)
+        if cached is not None:
+            yield _sse('done', {'response': cached, 'type': 'knowledge', 'session_id': session_id})
+            return
+
+        parts = []
+        try:
+            for text in generator.stream_rag_response(data['message'], rag_results):
+                parts.append(text)
+                yield _sse('token', {'text': text})
+            response = generator.format_response("".join(parts))
+            handler.store_kb_answer(data['message'], rag_results, response)
+        except Exception as e:
+            app.logger.error(f"Streaming generation error: {str(e)}")
+            yield _sse('error', {'error': str(e)})
+            response = generator.FALLBACK_ANSWER
+        yield _sse('done', {'response': response, 'type': 'knowledge', 'session_id': session_id})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _get_job(job_id: str):
+    if not components.is_ready('handler'):
+        return None, (jsonify({'error': 'The assistant is still starting up.'}), 503)
+    job = components.get('handler').jobs.get(job_id)
+    if job is None:
+        return None, (jsonify({'error': 'Unknown job'}), 404)
+    return job, None
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    return jsonify(job.to_dict(offset=request.args.get('offset', 0, type=int)))
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job, error = _get_job(job_id)
+    if error:
+        return error
+    cancelled = components.get('handler').jobs.cancel(job_id)
+    return jsonify({'job_id': job_id, 'cancelled': cancelled, 'status': job.status})
+
+@app.route('/api/jobs/<job_id>/stream')
+def stream_job(job_id):
+    """Server-Sent Events stream of a job's stdout, ending with its final result"""
+    job, error = _get_job(job_id)
+    if error:
+        return error
+
+    offset = request.args.get('offset', 0, type=int)
+
+    def events():
+        for line in job.iter_output(start=offset):
+            if line is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield _sse('output', {'text': line})
+        yield _sse('done', {'status': job.status, 'response': job.result_text()})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     pr = cProfile.Profile()
     pr.enable()
     start_time = time.time() # Simple timer start
 
+    start()
     app.run(port=5000, debug=False, use_reloader=False)
 
     pr.disable()
@@ -0,0 +1,84 @@
+# chatbot/answer_cache.py
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+class SemanticAnswerCache:
+    """Cache of generated knowledge-base answers keyed by query embedding.
+
+    A lookup hits when a cached query retrieved the same chunk IDs and its
+    embedding is within ``threshold`` cosine similarity of the new query.
+    Entries expire after ``ttl`` seconds, the least recently used ones are
+    evicted past ``max_entries``, and everything is dropped when the
+    knowledge base index version changes.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: float = 3600, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = None
+        self.entries: "OrderedDict[int, Tuple[Tuple[str, ...], np.ndarray, str, float]]" = OrderedDict()
+        self.by_chunks: Dict[Tuple[str, ...], set] = {}
+        self.hits = 0
+        self.misses = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _check_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.by_chunks.clear()
+            self.version = version
+
+    def _remove(self, entry_id: int):
+        chunk_key = self.entries.pop(entry_id)[0]
+        ids = self.by_chunks[chunk_key]
+        ids.discard(entry_id)
+        if not ids:
+            del self.by_chunks[chunk_key]
+
+    def get(self, embedding, chunk_ids: Iterable[str], version) -> Optional[str]:
+        chunk_key = tuple(sorted(chunk_ids))
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            best_id, best_sim = None, self.threshold
+            for entry_id in list(self.by_chunks.get(chunk_key, ())):
+                _, cached, _, created = self.entries[entry_id]
+                if now - created > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                similarity = float(np.dot(query, cached))
+                if similarity >= best_sim:
+                    best_id, best_sim = entry_id, similarity
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(best_id)
+            return self.entries[best_id][2]
+
+    def put(self, embedding, chunk_ids: Iterable[str], version, answer: str):
+        chunk_key = tuple(sorted(chunk_ids))
+        with self._lock:
+            self._check_version(version)
+            entry_id = self._next_id
+            self._next_id += 1
+            self.entries[entry_id] = (chunk_key, self._normalize(embedding), answer, time.time())
+            self.by_chunks.setdefault(chunk_key, set()).add(entry_id)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,105 @@
+# chatbot/batching.py
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+Prompt = Union[str, List[int]]
+Request = Tuple[Prompt, Dict[str, Any], Future]
+
+class GenerationScheduler:
+    """Dynamic micro-batching in front of a text2text-generation pipeline.
+
+    Prompts submitted from concurrent request threads are queued and a single
+    worker thread gathers them for up to ``max_wait_ms`` (or until
+    ``max_batch_size`` prompts arrived), then runs them through the pipeline
+    as one padded batch. Prompts may be strings or prompt token IDs; only
+    prompts of the same kind with identical generation kwargs share a batch.
+    """
+
+    def __init__(self, pipe: Callable, max_batch_size: int = 8, max_wait_ms: float = 20):
+        self.logger = logging.getLogger(__name__)
+        self.pipe = pipe
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[Request]]" = queue.Queue()  # None asks the worker to stop
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: Prompt, **generate_kwargs) -> Future:
+        if self._closed:
+            raise RuntimeError("GenerationScheduler is closed")
+        future = Future()
+        self._queue.put((prompt, generate_kwargs, future))
+        return future
+
+    def generate(self, prompt: Prompt, **generate_kwargs) -> str:
+        """Blocking helper returning the generated text for one prompt"""
+        return self.submit(prompt, **generate_kwargs).result()
+
+    @staticmethod
+    def _batch_key(prompt: Prompt, kwargs: Dict[str, Any]) -> Tuple:
+        return (isinstance(prompt, str),) + tuple(sorted(kwargs.items()))
+
+    def close(self, timeout: Optional[float] = None):
+        """Finish the requests already queued, then stop the worker thread"""
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def _collect(self) -> Tuple[List[Request], bool]:
+        """Block for the first request, then gather more until the window closes.
+
+        Returns the batch and whether the stop marker was reached.
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.max_batch_size:
+            if deadline is None:
+                item = self._queue.get()
+                deadline = time.monotonic() + self.max_wait
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stop = self._collect()
+            groups: Dict[Tuple, List[Request]] = {}
+            for item in batch:
+                groups.setdefault(self._batch_key(item[0], item[1]), []).append(item)
+            for items in groups.values():
+                self._run_batch(items)
+            if stop:
+                return
+
+    def _run_batch(self, items: List[Request]):
+        live = [item for item in items if item[2].set_running_or_notify_cancel()]
+        if not live:
+            return
+        prompts = [prompt for prompt, _, _ in live]
+        try:
+            outputs = self.pipe(prompts, batch_size=len(prompts), **live[0][1])
+        except Exception as e:
+            self.logger.error(f"Batched generation failed: {str(e)}")
+            for _, _, future in live:
+                future.set_exception(e)
+            return
+
+        for (_, _, future), output in zip(live, outputs):
+            # The pipeline returns a dict per prompt, or a list of dicts when it returns several sequences
+            if isinstance(output, list):
+                output = output[0]
+            future.set_result(output['generated_text'])
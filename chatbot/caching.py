@@ -1,14 +1,123 @@
 # chatbot/caching.py
+import threading
 import numpy as np
+from collections import OrderedDict
 from sentence_transformers import SentenceTransformer
-from typing import Dict
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List, Optional
+from chatbot.embedding_store import EmbeddingStore
 
-class EmbeddingCache:
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.cache: Dict[str, np.ndarray] = {}
+class EmbeddingCache(Embeddings):
+    """Shared MiniLM encoder used by intent classification and the knowledge base.
 
-    def get_embedding(self, text: str) -> np.ndarray:
-        if text not in self.cache:
-            self.cache[text] = self.model.encode(text)
-        return self.cache[text]
\ No newline at end of file
+    Every vector it produces is L2-normalized, so the same embedding can be
+    used for intent scoring and FAISS retrieval without a second forward pass.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 model_name: str = 'all-MiniLM-L6-v2', store_dir: Optional[str] = "./embedding_cache",
+                 batch_size: int = 64):
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.store = EmbeddingStore(store_dir, model_name) if store_dir else None
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get_embedding(self, text: str, persist: bool = False) -> np.ndarray:
+        with self._lock:
+            if text in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(text)
+                return self.cache[text]
+            self.misses += 1
+
+        embedding = self.store.get(text) if self.store else None
+        if embedding is None:
+            embedding = np.array(self._encode([text])[0])  # Copy: a row view keeps the whole batch alive
+            if self.store and persist:
+                self.store.add(text, embedding)
+        with self._lock:
+            self._put(text, embedding)
+        return embedding
+
+    def get_embeddings(self, texts: List[str], persist: bool = False) -> List[np.ndarray]:
+        """Embed many texts, encoding every cache miss in one batched call"""
+        unique = list(dict.fromkeys(texts))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for text in unique:
+                if text in self.cache:
+                    self.hits += 1
+                    self.cache.move_to_end(text)
+                    found[text] = self.cache[text]
+                else:
+                    self.misses += 1
+
+        misses = []
+        for text in unique:
+            if text in found:
+                continue
+            stored = self.store.get(text) if self.store else None
+            if stored is None:
+                misses.append(text)
+            else:
+                found[text] = stored
+
+        if misses:
+            encoded = self._encode(misses)
+            for text, row in zip(misses, encoded):
+                embedding = np.array(row)  # Copy, so max_bytes bounds what the LRU actually retains
+                found[text] = embedding
+                if self.store and persist:
+                    self.store.add(text, embedding)
+
+        with self._lock:
+            for text, embedding in found.items():
+                self._put(text, embedding)
+        return [found[text] for text in texts]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """LangChain hook for indexing; document chunks bypass the query LRU"""
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """LangChain hook for retrieval; reuses any embedding cached for intents"""
+        return self.get_embedding(text).tolist()
+
+    def flush(self):
+        """Persist newly encoded embeddings to the on-disk store"""
+        if self.store:
+            self.store.flush()
+
+    def _put(self, text: str, embedding: np.ndarray):
+        """Insert an entry and evict least recently used ones past the budgets"""
+        if text in self.cache:
+            self.cache.move_to_end(text)
+            return
+        self.cache[text] = embedding
+        self.nbytes += embedding.nbytes
+        while self.cache and (len(self.cache) > self.max_entries or self.nbytes > self.max_bytes):
+            _, evicted = self.cache.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters"""
+        with self._lock:
+            return {
+                "entries": len(self.cache),
+                "bytes": self.nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
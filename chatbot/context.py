@@ -0,0 +1,69 @@
+# chatbot/context.py
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+class ContextAssembler:
+    """Packs retrieved chunks into an exact encoder token budget.
+
+    Each chunk is tokenized once and its token IDs are cached by chunk ID.
+    The prompt is assembled directly as token IDs (prefix + labelled chunks
+    + suffix + EOS), so the model never re-tokenizes it and never encodes
+    context that would be truncated away.
+    """
+
+    def __init__(self, tokenizer, prefix: str, suffix: str, max_tokens: Optional[int] = None,
+                 clean: Callable[[str], str] = str.strip, cache_size: int = 4096, min_chunk_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.prefix = prefix
+        self.suffix_ids = self._encode(suffix)
+        self.max_tokens = max_tokens or tokenizer.model_max_length
+        self.clean = clean
+        self.cache_size = cache_size
+        self.min_chunk_tokens = min_chunk_tokens
+        self._chunk_ids: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._label_ids: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def _content_ids(self, result: Dict) -> List[int]:
+        chunk_id = result.get("id")
+        if chunk_id is None:
+            return self._encode(self.clean(result["content"]))
+        with self._lock:
+            ids = self._chunk_ids.get(chunk_id)
+            if ids is not None:
+                self._chunk_ids.move_to_end(chunk_id)
+                return ids
+        ids = self._encode(self.clean(result["content"]))
+        with self._lock:
+            self._chunk_ids[chunk_id] = ids
+            while len(self._chunk_ids) > self.cache_size:
+                self._chunk_ids.popitem(last=False)
+        return ids
+
+    def _label(self, n: int) -> List[int]:
+        if n not in self._label_ids:
+            self._label_ids[n] = self._encode(f"\n[Document {n}]:")
+        return self._label_ids[n]
+
+    def assemble(self, query: str, results: List[Dict]) -> List[int]:
+        """Return prompt token IDs for the query with as many chunks as fit, in order"""
+        eos = [self.tokenizer.eos_token_id]
+        prefix_ids = self._encode(self.prefix.format(query=query))
+        budget = self.max_tokens - len(prefix_ids) - len(self.suffix_ids) - len(eos)
+        if budget < 0:
+            # Pathologically long query: keep the instruction suffix intact
+            prefix_ids = prefix_ids[:self.max_tokens - len(self.suffix_ids) - len(eos)]
+            budget = 0
+
+        context: List[int] = []
+        for n, result in enumerate(results, 1):
+            label = self._label(n)
+            remaining = budget - len(context) - len(label)
+            if remaining < self.min_chunk_tokens:
+                break
+            context += label + self._content_ids(result)[:remaining]
+        return prefix_ids + context + self.suffix_ids + eos
@@ -0,0 +1,112 @@
+# chatbot/embedding_store.py
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+from chatbot.file_lock import file_lock
+
+class EmbeddingStore:
+    """Append-only on-disk embedding store backed by a memory-mapped float32 array.
+
+    Vectors live in ``vectors.f32`` (raw rows of ``dim`` floats) and the row
+    index lives in ``keys.json``. Rows are appended before the index is
+    atomically replaced, so other worker processes can map the same files
+    read-only and never see a key without its vector. Flushes from several
+    processes are serialized by an exclusive lock on ``flush.lock``, and each
+    flush appends after the index it reads under that lock.
+    """
+
+    def __init__(self, root: str, model_name: str):
+        self.logger = logging.getLogger(__name__)
+        self.model_name = model_name
+        self.path = os.path.join(root, model_name.replace("/", "__"))
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.keys_path = os.path.join(self.path, "keys.json")
+        self.lock_path = os.path.join(self.path, "flush.lock")
+        self.dim: Optional[int] = None
+        self.index: Dict[str, int] = {}
+        self.vectors: Optional[np.memmap] = None
+        self.pending: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self.refresh()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _read_index(self) -> Optional[dict]:
+        try:
+            with open(self.keys_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error(f"Embedding store index unreadable: {str(e)}")
+            return None
+
+    def refresh(self):
+        """(Re)map the on-disk vectors and reload the row index"""
+        data = self._read_index()
+        if data is None:
+            return
+
+        keys = data.get("keys", [])
+        with self._lock:
+            self.dim = data["dim"]
+            self.index = {k: i for i, k in enumerate(keys)}
+            self.vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(len(keys), self.dim)
+            ) if keys else None
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        with self._lock:
+            if key in self.pending:
+                return self.pending[key]
+            row = self.index.get(key)
+            if row is None:
+                return None
+            return np.array(self.vectors[row])
+
+    def add(self, text: str, embedding: np.ndarray):
+        with self._lock:
+            key = self._key(text)
+            if key not in self.index:
+                self.pending[key] = np.asarray(embedding, dtype=np.float32)
+
+    def flush(self):
+        """Append pending vectors to disk and atomically publish the new index"""
+        with self._lock, file_lock(self.lock_path):
+            if not self.pending:
+                return
+            # Another process may have flushed since this one last refreshed: append after the
+            # index on disk, never after our possibly stale copy of it
+            data = self._read_index() or {}
+            keys: List[str] = data.get("keys", [])
+            dim = data.get("dim", self.dim)
+            on_disk = set(keys)
+            new_keys = [k for k in self.pending if k not in on_disk]
+            if new_keys:
+                rows = np.vstack([self.pending[k] for k in new_keys]).astype(np.float32)
+                if dim is None:
+                    dim = rows.shape[1]
+                elif rows.shape[1] != dim:
+                    raise ValueError(f"Embedding dimension {rows.shape[1]} does not match store dimension {dim}")
+
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(len(keys) * dim * 4)  # Drop rows orphaned by an interrupted flush
+                    f.write(np.ascontiguousarray(rows).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                keys.extend(new_keys)
+                tmp_path = f"{self.keys_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump({"model": self.model_name, "dim": dim, "keys": keys}, f)
+                os.replace(tmp_path, self.keys_path)
+            self.pending.clear()
+
+        self.refresh()
@@ -0,0 +1,19 @@
+# chatbot/file_lock.py
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: callers are serialized within a process only
+    fcntl = None
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on ``path``, shared by every process on the host"""
+    with open(path, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,153 @@
+# chatbot/flow_store.py
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class FlowState:
+    """Progress of one session through a troubleshooting flow"""
+    __slots__ = ("tag", "step", "answers", "started_at", "touched_at")
+
+    def __init__(self, tag: str, step: int = 0, answers: Optional[Dict[str, str]] = None,
+                 started_at: Optional[float] = None, touched_at: Optional[float] = None):
+        self.tag = tag  # Intent tag; the flow definition itself stays in intents.json
+        self.step = step
+        self.answers = answers if answers is not None else {}
+        self.started_at = started_at if started_at is not None else time.time()
+        self.touched_at = touched_at if touched_at is not None else self.started_at
+
+class FlowStore(ABC):
+    """Interface for flow session storage.
+
+    Sessions idle for longer than ``ttl`` seconds expire, and past
+    ``max_sessions`` the least recently used session is evicted.
+    """
+
+    def __init__(self, ttl: float = 1800, max_sessions: int = 10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[FlowState]:
+        """Return the session's live state, refreshing its last-used time"""
+
+    @abstractmethod
+    def put(self, session_id: str, state: FlowState):
+        """Save the session's state"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget the session"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of unexpired sessions"""
+
+class MemoryFlowStore(FlowStore):
+    """In-process store: an LRU-ordered dict, private to one worker process"""
+
+    def __init__(self, ttl: float = 1800, max_sessions: int = 10000):
+        super().__init__(ttl, max_sessions)
+        self.sessions: "OrderedDict[str, FlowState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge_expired(self, now: float):
+        # Oldest-touched sessions sit at the front
+        while self.sessions:
+            session_id, state = next(iter(self.sessions.items()))
+            if now - state.touched_at <= self.ttl:
+                break
+            del self.sessions[session_id]
+
+    def get(self, session_id: str) -> Optional[FlowState]:
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            state = self.sessions.get(session_id)
+            if state is not None:
+                state.touched_at = now
+                self.sessions.move_to_end(session_id)
+            return state
+
+    def put(self, session_id: str, state: FlowState):
+        now = time.time()
+        with self._lock:
+            state.touched_at = now
+            self.sessions[session_id] = state
+            self.sessions.move_to_end(session_id)
+            self._purge_expired(now)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purge_expired(time.time())
+            return len(self.sessions)
+
+class SQLiteFlowStore(FlowStore):
+    """Store in a local SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path: str = "./flow_sessions.db", ttl: float = 1800, max_sessions: int = 10000):
+        super().__init__(ttl, max_sessions)
+        self.path = path
+        self._local = threading.local()  # One connection per thread
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS flow_sessions ("
+                "session_id TEXT PRIMARY KEY, tag TEXT NOT NULL, step INTEGER NOT NULL, "
+                "answers TEXT NOT NULL, started_at REAL NOT NULL, touched_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS flow_sessions_touched ON flow_sessions (touched_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")  # Readers do not block the writer
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, session_id: str) -> Optional[FlowState]:
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT tag, step, answers, started_at FROM flow_sessions "
+                "WHERE session_id = ? AND touched_at >= ?",
+                (session_id, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE flow_sessions SET touched_at = ? WHERE session_id = ?", (now, session_id))
+        return FlowState(row[0], row[1], json.loads(row[2]), row[3], now)
+
+    def put(self, session_id: str, state: FlowState):
+        now = time.time()
+        state.touched_at = now
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO flow_sessions VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, state.tag, state.step, json.dumps(state.answers), state.started_at, now)
+            )
+            db.execute("DELETE FROM flow_sessions WHERE touched_at < ?", (now - self.ttl,))
+            db.execute(
+                "DELETE FROM flow_sessions WHERE session_id IN ("
+                "SELECT session_id FROM flow_sessions ORDER BY touched_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+
+    def delete(self, session_id: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM flow_sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM flow_sessions WHERE touched_at >= ?", (time.time() - self.ttl,)
+        ).fetchone()[0]
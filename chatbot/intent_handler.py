@@ -1,25 +1,37 @@
 import os
 import json
+import time
+import threading
 import numpy as np
-import subprocess
 import logging
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
+from chatbot.answer_cache import SemanticAnswerCache
+from chatbot.flow_store import FlowState, FlowStore, MemoryFlowStore
+from chatbot.jobs import ScriptJobQueue, JobRejected
+from chatbot.startup import ComponentNotReady
+from chatbot.worker_pool import ScriptWorkerPool
 
 class IntentHandler:
-    def __init__(self, cache, kb, generator):
+    def __init__(self, cache, kb, generator, flow_store: Optional[FlowStore] = None):
         self.cache = cache
         self.kb = kb
         self.generator = generator
         self.logger = logging.getLogger(__name__)
-        self.flows = {}
+        self.flows = flow_store if flow_store is not None else MemoryFlowStore()
+        self.answer_cache = SemanticAnswerCache()
+        self._script_results: Dict[str, object] = {}  # Latest job per cacheable intent
+        self._script_results_lock = threading.Lock()
         self._load_intents()
+        self.jobs = ScriptJobQueue(pool=self._build_worker_pool())
 
     def _load_intents(self):
         """Load and validate intents"""
         with open("intents.json") as f:
             data = json.load(f)
             self.intents = data["intents"]
+            self.flow_definitions = {i["tag"]: i["flow"] for i in self.intents if i.get("flow")}
             self.intent_embeddings = self._precompute_embeddings()
+            self.cache.flush()
             
             # Validate required fields
             for intent in self.intents:
@@ -35,74 +47,116 @@ class IntentHandler:
                 if not os.path.exists(intent["script"]):
                     self.logger.warning(f"Script not found: {intent['script']}")
 
+        valid = []
         for intent in self.intents:
             if not intent.get("patterns"):
                 self.logger.error(f"Intent {intent['tag']} has no patterns")
                 continue
-                
+            valid.append(intent)
+
+        # Encode every pattern of every intent in one batched pass
+        patterns = [p for intent in valid for p in intent["patterns"]]
+        pattern_embeddings = self.cache.get_embeddings(patterns, persist=True)
+
+        offset = 0
+        for intent in valid:
+            count = len(intent["patterns"])
             embeddings.append({
                 "tag": intent["tag"],
                 "script": intent.get("script"),
                 "flow": intent.get("flow", []),
-                "embedding": np.mean([
-                    self.cache.get_embedding(p)
-                    for p in intent["patterns"]
-                ], axis=0)
+                "cache_ttl": intent.get("cache_ttl", 30) if intent.get("cacheable") else None,
+                "embedding": np.mean(pattern_embeddings[offset:offset + count], axis=0)
             })
+            offset += count
+        self.intent_matrix = self._build_intent_matrix(embeddings)
         return embeddings
 
-    def _run_script(self, script_path: str, params: dict = None) -> str:
-    # Convert to absolute path
-        abs_path = os.path.abspath(script_path)
-    
-        if not os.path.exists(abs_path):
-            return f"Script not found at: {abs_path}"
-        
-        try:
-            cmd = ["python", abs_path]
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=60,
-                shell=True,  # Required for paths with spaces on Windows
-                check=True  # Raise exception on non-zero exit
-            )
-            return result.stdout.strip() or "Script executed successfully"
-        except subprocess.CalledProcessError as e:
-            return f"Script failed (code {e.returncode}): {e.stderr}"
-        except Exception as e:
-            return f"Execution error: {str(e)}"
-
-    def classify_intent(self, query: str) -> Dict:
-        query_embed = self.cache.get_embedding(query)
-        query_norm = query_embed / np.linalg.norm(query_embed)
-    
-        best_match = None
-        max_sim = -1
-    
-        for intent in self.intent_embeddings:
-            intent_embed = intent["embedding"]
-            intent_norm = intent_embed / np.linalg.norm(intent_embed)
-            similarity = np.dot(query_norm, intent_norm)  # Cosine similarity
-        
-            if similarity > max_sim:
-                max_sim = similarity
-                best_match = intent
-            
-        return {**best_match, "confidence": float(max_sim)}
+    @staticmethod
+    def _build_intent_matrix(embeddings: List[Dict]) -> np.ndarray:
+        """Stack intent centroids into one contiguous, L2-normalized float32 matrix"""
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.vstack([e["embedding"] for e in embeddings]).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms)
+
+    def _build_worker_pool(self) -> Optional[ScriptWorkerPool]:
+        """Pre-warm in-process workers for intents marked with "worker_pool": true"""
+        scripts = [
+            intent["script"] for intent in self.intents
+            if intent.get("worker_pool") and intent.get("script") and os.path.exists(intent["script"])
+        ]
+        return ScriptWorkerPool(scripts) if scripts else None
+
+    def _submit_intent_script(self, intent: Dict):
+        """Submit an intent's script, reusing fresh or in-flight results of cacheable intents.
+
+        Read-only intents flagged "cacheable" in intents.json return their last
+        successful job while it is younger than "cache_ttl" seconds, and
+        concurrent requests share the job that is still running.
+        """
+        ttl = intent.get("cache_ttl")
+        if ttl is None:
+            return self.jobs.submit(intent["script"])
+
+        with self._script_results_lock:
+            job = self._script_results.get(intent["tag"])
+            if job is not None:
+                if not job.done:
+                    return job
+                if job.status == "succeeded" and time.time() - job.finished_at <= ttl:
+                    return job
+            job = self.jobs.submit(intent["script"])
+            self._script_results[intent["tag"]] = job
+            return job
 
-    def handle_query(self, query: str, session_id: str, mode: str) -> Tuple[str, str]:
-        """Handle query with enhanced RAG integration"""
+    def classify_intent(self, query: str, top_k: int = 3) -> Dict:
+        """Score the query against every intent centroid in one matrix-vector product"""
+        if not self.intent_embeddings:
+            # No valid intents loaded; the caller asks the user to clarify
+            return {"tag": None, "script": None, "flow": [], "cache_ttl": None,
+                    "confidence": 0.0, "alternatives": []}
+        query_embed = np.asarray(self.cache.get_embedding(query), dtype=np.float32)
+        query_norm = query_embed / (np.linalg.norm(query_embed) or 1.0)
+
+        similarities = self.intent_matrix @ query_norm  # Cosine similarity
+        k = min(top_k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+
+        best_match = self.intent_embeddings[top[0]]
+        return {
+            **best_match,
+            "confidence": float(similarities[top[0]]),
+            "alternatives": [
+                {"tag": self.intent_embeddings[i]["tag"], "confidence": float(similarities[i])}
+                for i in top[1:]
+            ]
+        }
+
+    def handle_query(self, query: str, session_id: str, mode: str) -> Tuple:
+        """Handle query with enhanced RAG integration
+
+        Returns (response, type) or (response, type, extra) where extra is a
+        dict of additional response fields such as flow options or a job ID.
+        """
         try:
             if mode == "kb":
                 rag_results = self.kb.search(query)
                 if not rag_results:
                     return "No relevant documentation found. Try rephrasing.", "knowledge"
-                return self.generator.enhance_rag_response(query, rag_results), "knowledge"
+                cached = self.lookup_kb_answer(query, rag_results)
+                if cached is not None:
+                    return cached, "knowledge"
+                answer = self.generator.enhance_rag_response(query, rag_results)
+                self.store_kb_answer(query, rag_results, answer)
+                return answer, "knowledge"
             
-            if session_id in self.flows:
-                return self._continue_flow(session_id, query)
+            flow_state = self.flows.get(session_id)
+            if flow_state is not None:
+                return self._continue_flow(session_id, flow_state, query)
                 
             intent = self.classify_intent(query)
             
@@ -110,60 +164,83 @@ class IntentHandler:
                 return "Could not determine intent. Please provide more details.", "clarify"
                 
             if intent["flow"]:
-                return self._start_flow(intent["flow"], session_id)
+                return self._start_flow(intent["tag"], session_id)
                 
             if intent["script"]:
-                output = self._run_script(intent["script"])
-                #return self.generator.humanize(f"{intent['tag']}:\n{output}"), "action"
-                return f"{intent['tag']}:\n{output}", "action"
+                # Scripts run off the request thread; clients follow the job by ID
+                try:
+                    job = self._submit_intent_script(intent)
+                except JobRejected as e:
+                    return str(e), "error"
+                if job.status == "succeeded":
+                    return f"{intent['tag']}:\n{job.result_text()}", "action"
+                return f"{intent['tag']}: running `{os.path.basename(intent['script'])}`", "job", {"job_id": job.id}
                 
             return "I need more information to resolve this issue.", "clarify"
             
         except Exception as e:
             self.logger.error(f"Handler error: {str(e)}")
-            return self.generator.humanize("System error occurred"), "error"
+            return self._humanize("System error occurred"), "error"
+
+    def _humanize(self, text: str) -> str:
+        """Rephrase with the generator when it is loaded; script mode must not wait for it"""
+        try:
+            return self.generator.humanize(text)
+        except ComponentNotReady:
+            return text
 
-    def _start_flow(self, flow: List[Dict], session_id: str) -> Tuple[str, str]:
+    def lookup_kb_answer(self, query: str, rag_results: List[Dict]) -> Optional[str]:
+        """Return a cached answer for a semantically equivalent query over the same chunks"""
+        return self.answer_cache.get(
+            self.cache.get_embedding(query), [r["id"] for r in rag_results], self.kb.version
+        )
+
+    def store_kb_answer(self, query: str, rag_results: List[Dict], answer: str):
+        if answer == self.generator.FALLBACK_ANSWER:
+            return
+        self.answer_cache.put(
+            self.cache.get_embedding(query), [r["id"] for r in rag_results], self.kb.version, answer
+        )
+
+    def _start_flow(self, tag: str, session_id: str) -> Tuple:
         """Initialize troubleshooting flow"""
-        self.flows[session_id] = {
-            "current_step": 0,
-            "answers": {},
-            "flow": flow,
-            "start_time": time.time()
-        }
-        first_step = flow[0]
+        self.flows.put(session_id, FlowState(tag))
+        first_step = self.flow_definitions[tag][0]
         return (
             f"## {first_step['question']}\n{first_step.get('hint', '')}",
             "flow_question",
-            first_step.get("options", [])
+            {"options": first_step.get("options", [])}
         )
 
-    def _continue_flow(self, session_id: str, answer: str) -> Tuple[str, str]:
+    def _continue_flow(self, session_id: str, flow_state: FlowState, answer: str) -> Tuple:
         """Progress through troubleshooting flow"""
-        flow_state = self.flows.get(session_id)
-        if not flow_state:
+        flow = self.flow_definitions.get(flow_state.tag)
+        if not flow or flow_state.step >= len(flow):
+            self.flows.delete(session_id)
             return "Session expired. Please start over.", "error"
             
-        current_step = flow_state["flow"][flow_state["current_step"]]
-        flow_state["answers"][current_step["key"]] = answer
+        current_step = flow[flow_state.step]
+        flow_state.answers[current_step["key"]] = answer
         
-        next_step_index = flow_state["current_step"] + 1
-        if next_step_index < len(flow_state["flow"]):
-            flow_state["current_step"] = next_step_index
-            next_step = flow_state["flow"][next_step_index]
+        next_step_index = flow_state.step + 1
+        if next_step_index < len(flow):
+            flow_state.step = next_step_index
+            self.flows.put(session_id, flow_state)  # Persist progress for the session's next request
+            next_step = flow[next_step_index]
             return (
                 f"## {next_step['question']}\n{next_step.get('hint', '')}",
                 "flow_question",
-                next_step.get("options", [])
+                {"options": next_step.get("options", [])}
             )
             
-        # Execute final script with collected parameters
-        del self.flows[session_id]
+        # Execute final script with collected parameters, off the request thread like intent scripts;
+        # its output is humanized on the job's thread once it finishes
+        self.flows.delete(session_id)
+        script = flow[-1]["script"]
         try:
-            output = self._run_script(
-                flow_state["flow"][-1]["script"],
-                flow_state["answers"]
-            )
-            return self.generator.humanize(output), "action"
+            job = self.jobs.submit(script, flow_state.answers, respond=self._humanize)
+        except JobRejected as e:
+            return str(e), "error"
         except Exception as e:
-            return f"Failed to execute resolution: {str(e)}", "error"
\ No newline at end of file
+            return f"Failed to execute resolution: {str(e)}", "error"
+        return f"{flow_state.tag}: running `{os.path.basename(script)}`", "job", {"job_id": job.id}
\ No newline at end of file
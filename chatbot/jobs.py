@@ -0,0 +1,252 @@
+# chatbot/jobs.py
+import os
+import sys
+import time
+import uuid
+import logging
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+from chatbot.worker_pool import ScriptWorkerPool
+
+class JobRejected(RuntimeError):
+    """Raised when a job cannot be queued (queue full or script at its concurrency limit)"""
+
+class ScriptJob:
+    """State of one script execution; output lines are appended as they arrive"""
+
+    def __init__(self, script_path: str, params: Optional[dict] = None):
+        self.id = uuid.uuid4().hex
+        self.script_path = script_path
+        self.params = params or {}
+        self.status = "queued"
+        self.output: List[str] = []
+        self.stderr = ""
+        self.returncode: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.process: Optional[subprocess.Popen] = None
+        self.response: Optional[str] = None  # Chat-facing result, set when the job finishes
+        self._cancel_requested = False
+        self._on_done: Optional[Callable[[], None]] = None  # Set by the queue to free the script's slot
+        self._respond: Optional[Callable[[str], str]] = None  # Rewrites the result text before it is published
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled", "timeout")
+
+    def _append(self, line: str):
+        with self._changed:
+            self.output.append(line)
+            self._changed.notify_all()
+
+    def _finish(self, status: str):
+        # Free the queue slot first, so a caller that sees the job done can resubmit at once
+        if self._on_done:
+            self._on_done()
+        response = self._result_text(status)
+        if self._respond:
+            try:
+                response = self._respond(response)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Script job {self.id} response error: {str(e)}")
+        with self._changed:
+            self.status = status
+            self.response = response
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        with self._changed:
+            return self._changed.wait_for(lambda: self.done, timeout)
+
+    def iter_output(self, start: int = 0, poll: float = 15.0) -> Iterator[Optional[str]]:
+        """Yield output lines from ``start`` as they arrive until the job finishes.
+
+        Yields None every ``poll`` seconds without new output so callers can
+        send keep-alives.
+        """
+        index = start
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: len(self.output) > index or self.done, poll)
+                lines = self.output[index:]
+                finished = self.done
+            if not lines and not finished:
+                yield None
+            for line in lines:
+                yield line
+            index += len(lines)
+            if finished and index >= len(self.output):
+                return
+
+    def result_text(self) -> str:
+        """Chat-facing summary matching the synchronous script runner"""
+        if self.response is not None:
+            return self.response
+        return self._result_text(self.status)
+
+    def _result_text(self, status: str) -> str:
+        if status == "succeeded":
+            return "".join(self.output).strip() or "Script executed successfully"
+        if status == "failed" and self.returncode is not None:
+            return f"Script failed (code {self.returncode}): {self.stderr}"
+        if status == "timeout":
+            return "Execution error: script timed out"
+        if status == "cancelled":
+            return "Script was cancelled"
+        return self.error or "Execution error"
+
+    def to_dict(self, offset: int = 0) -> Dict:
+        return {
+            "job_id": self.id,
+            "script": self.script_path,
+            "status": self.status,
+            "returncode": self.returncode,
+            "output": "".join(self.output[offset:]),
+            "next_offset": len(self.output),
+            "stderr": self.stderr,
+            "error": self.error,
+            "response": self.response,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class ScriptJobQueue:
+    """Bounded executor for intent scripts that keeps request threads free.
+
+    Jobs run as subprocesses supervised by a small thread pool, or on a
+    pre-warmed ScriptWorkerPool for the scripts it handles. Each script
+    has a concurrency limit covering its queued and running jobs, and the
+    whole queue rejects new work past ``max_pending`` unfinished jobs.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, timeout: float = 60,
+                 default_limit: int = 2, script_limits: Optional[Dict[str, int]] = None,
+                 max_history: int = 256, pool: Optional[ScriptWorkerPool] = None):
+        self.logger = logging.getLogger(__name__)
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.default_limit = default_limit
+        # Keyed like _active, so a limit applies whether it was given as a relative or absolute path
+        self.script_limits = {os.path.abspath(path): limit for path, limit in (script_limits or {}).items()}
+        self.max_history = max_history
+        self.pool = pool
+        self.jobs: "OrderedDict[str, ScriptJob]" = OrderedDict()
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="script-job")
+
+    def submit(self, script_path: str, params: Optional[dict] = None,
+               respond: Optional[Callable[[str], str]] = None) -> ScriptJob:
+        """Queue a script; ``respond`` rewrites its result text on the job's thread before it is marked done"""
+        abs_path = os.path.abspath(script_path)
+        job = ScriptJob(abs_path, params)
+        job._respond = respond
+        with self._lock:
+            pending = sum(self._active.values())
+            if pending >= self.max_pending:
+                raise JobRejected("Too many scripts are queued. Please try again shortly.")
+            limit = self.script_limits.get(abs_path, self.default_limit)
+            if self._active.get(abs_path, 0) >= limit:
+                raise JobRejected(f"{os.path.basename(abs_path)} is already running. Please wait for it to finish.")
+            self._active[abs_path] = self._active.get(abs_path, 0) + 1
+            job._on_done = lambda: self._release(job)
+            self.jobs[job.id] = job
+            self._trim_history()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _trim_history(self):
+        while len(self.jobs) > self.max_history:
+            oldest_id = next(iter(self.jobs))
+            if not self.jobs[oldest_id].done:
+                break
+            del self.jobs[oldest_id]
+
+    def _release(self, job: ScriptJob):
+        """Give back the job's concurrency slot; safe to call more than once"""
+        with self._lock:
+            if job._on_done is None:
+                return
+            job._on_done = None
+            self._active[job.script_path] -= 1
+            if not self._active[job.script_path]:
+                del self._active[job.script_path]
+
+    def get(self, job_id: str) -> Optional[ScriptJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job._cancel_requested = True
+        if job.process and job.process.poll() is None:
+            job.process.terminate()
+        return True
+
+    def _run(self, job: ScriptJob):
+        try:
+            if job._cancel_requested:
+                job._finish("cancelled")
+                return
+            if not os.path.exists(job.script_path):
+                job.error = f"Script not found at: {job.script_path}"
+                job._finish("failed")
+                return
+            if self.pool and self.pool.handles(job.script_path):
+                self.pool.run(job, self.timeout)
+                return
+
+            job.started_at = time.time()
+            job.status = "running"
+            job.process = subprocess.Popen(
+                [sys.executable, job.script_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                cwd=os.getcwd()
+            )
+            # Drain stderr on the side so a chatty script cannot block on a full pipe
+            stderr_parts: List[str] = []
+            stderr_reader = threading.Thread(
+                target=lambda: stderr_parts.append(job.process.stderr.read()), daemon=True
+            )
+            stderr_reader.start()
+            timed_out = threading.Event()
+
+            def expire():
+                timed_out.set()
+                job.process.kill()
+
+            timer = threading.Timer(self.timeout, expire)
+            timer.start()
+            try:
+                for line in job.process.stdout:
+                    job._append(line)
+                job.returncode = job.process.wait()
+            finally:
+                timer.cancel()
+            stderr_reader.join()
+            job.stderr = "".join(stderr_parts)
+
+            if job._cancel_requested:
+                job._finish("cancelled")
+            elif timed_out.is_set():
+                job._finish("timeout")
+            else:
+                job._finish("succeeded" if job.returncode == 0 else "failed")
+
+        except Exception as e:
+            self.logger.error(f"Script job {job.id} error: {str(e)}")
+            job.error = f"Execution error: {str(e)}"
+            job._finish("failed")
+        finally:
+            self._release(job)
@@ -1,67 +1,314 @@
 import os
+import json
+import hashlib
 import logging
-from typing import List, Dict
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader, Docx2txtLoader
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Iterator, Optional, Tuple
+from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader
 from langchain_community.vectorstores import FAISS
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
+from chatbot.file_lock import file_lock
+from chatbot.startup import process_context
+
+LOADERS = {
+    '.pdf': PyPDFLoader,
+    '.txt': TextLoader,
+    '.docx': Docx2txtLoader
+}
+
+SPLITTER_KWARGS = {
+    "chunk_size": 1200,
+    "chunk_overlap": 300,
+    "separators": ["\n\n", "\n", ". ", " ", ""]
+}
+
+def _parse_and_split(path: str) -> List[Document]:
+    """Parse and split one document; runs inside ingestion worker processes"""
+    loader_cls = LOADERS.get(os.path.splitext(path)[1].lower(), TextLoader)
+    splitter = RecursiveCharacterTextSplitter(**SPLITTER_KWARGS)
+    return splitter.split_documents(loader_cls(path).load())
 
 class KnowledgeBase:
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        self.db = self._init_vector_store()
+    def __init__(self, embeddings: Embeddings, docs_dir: str = "./knowledge_docs",
+                 index_dir: str = "./faiss_index", ingest_workers: Optional[int] = None,
+                 embed_batch_size: int = 256):
         self.logger = logging.getLogger(__name__)
+        self.embeddings = embeddings
+        self.docs_dir = docs_dir
+        self.index_dir = index_dir
+        self.manifest_path = os.path.join(index_dir, "manifest.json")
+        self.lock_path = os.path.join(index_dir, "index.lock")
+        self.ingest_workers = ingest_workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.manifest: Dict = {}
+        self.version = 0
+        self._reindex_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watcher = threading.Event()
+        self.db = self._init_vector_store()
 
     def _init_vector_store(self):
-        """Initialize vector store with enhanced metadata"""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1200,
-            chunk_overlap=300,
-            separators=["\n\n", "\n", ". ", " ", ""]
+        """Load the persisted index and re-embed only new or changed documents"""
+        try:
+            db, self.manifest = self._build_index()
+            if db is None:
+                return FAISS.from_texts(["No documents indexed"], self.embeddings)
+            return db
+
+        except Exception as e:
+            self.logger.error(f"Vector store init failed: {str(e)}")
+            return FAISS.from_texts(["Error loading documents"], self.embeddings)
+
+    def _build_index(self) -> Tuple[Optional[FAISS], Dict]:
+        """Build an up-to-date index as a fresh object, never touching self.db.
+
+        Load, sync and save run under an inter-process lock on index_dir, so
+        Gunicorn workers never read a half-written index or interleave their
+        writes; a worker that waited loads what the previous one saved.
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        with file_lock(self.lock_path):
+            db, manifest = self._load_index()
+            db, manifest, changed = self._sync_index(db, manifest)
+            if db is not None and changed:
+                self._save_index(db, manifest)
+        return db, manifest
+
+    def _docs_changed(self) -> bool:
+        """Cheap size/mtime comparison of docs_dir against the live manifest"""
+        files = self.manifest.get("files", {})
+        current = self._scan_docs()
+        if current.keys() != files.keys():
+            return True
+        return any(
+            files[rel]["size"] != info["size"] or files[rel]["mtime"] != info["mtime"]
+            for rel, info in current.items()
         )
 
-        loaders = {
-            '.pdf': PyPDFLoader,
-            '.txt': TextLoader,
-            '.docx': Docx2txtLoader
-        }
+    def reindex(self, force: bool = False) -> bool:
+        """Rebuild the index off the request path and swap it in atomically.
 
-        try:
-            loader = DirectoryLoader(
-                './knowledge_docs',
-                glob="**/*.*",
-                loader_cls=lambda path: loaders.get(os.path.splitext(path)[1], TextLoader)(path),
-                show_progress=True
-            )
-            docs = loader.load()
-            splits = text_splitter.split_documents(docs)
-            
+        search() keeps serving the previous index until the new one is
+        complete. Returns True when a new index was swapped in.
+        """
+        with self._reindex_lock:
+            if not force and not self._docs_changed():
+                return False
+            old_ids = self._chunk_ids(self.manifest)
+            db, manifest = self._build_index()
+            if db is None:
+                db = FAISS.from_texts(["No documents indexed"], self.embeddings)
+            # Single attribute assignments are atomic; readers see old or new, never partial
+            self.db, self.manifest = db, manifest
+            if self._chunk_ids(manifest) == old_ids:
+                return False  # Same chunks (e.g. only mtimes moved); keep caches keyed on the version
+            self.version += 1
+            self.logger.info(f"Knowledge base index swapped (version {self.version})")
+            return True
+
+    @staticmethod
+    def _chunk_ids(manifest: Optional[Dict]) -> set:
+        return {chunk_id for info in (manifest or {}).get("files", {}).values() for chunk_id in info["ids"]}
+
+    def start_watcher(self, interval: float = 30.0):
+        """Poll docs_dir in a daemon thread and reindex when files change"""
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._stop_watcher.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name="kb-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_watcher.set()
+        if self._watcher:
+            self._watcher.join()
+
+    def _watch(self, interval: float):
+        while not self._stop_watcher.wait(interval):
+            try:
+                self.reindex()
+            except Exception as e:
+                self.logger.error(f"Background reindex failed: {str(e)}")
+
+    def _scan_docs(self) -> Dict[str, Dict]:
+        """Stat every document under docs_dir, keyed by relative path"""
+        found = {}
+        for root, _, files in os.walk(self.docs_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                rel = os.path.relpath(path, self.docs_dir).replace(os.sep, "/")
+                found[rel] = {"size": st.st_size, "mtime": st.st_mtime}
+        return found
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _assign_ids(self, rel: str, sha: str, splits: List[Document]) -> List[str]:
+        """Give a document's chunks stable IDs and normalized metadata"""
+        prefix = hashlib.sha1(f"{rel}\0{sha}".encode("utf-8")).hexdigest()[:16]
+        ids = [f"{prefix}-{i}" for i in range(len(splits))]
+        for doc, chunk_id in zip(splits, ids):
             # Add page numbers to metadata
-            for doc in splits:
-                doc.metadata.setdefault('page', 'N/A')
-                
-            return FAISS.from_documents(splits, self.embeddings)
-            
+            doc.metadata.setdefault('page', 'N/A')
+            doc.metadata['chunk_id'] = chunk_id
+        return ids
+
+    def _parsed_docs(self, rels: List[str]) -> Iterator[Tuple[str, Optional[List[Document]]]]:
+        """Yield (rel, splits) as soon as each file is parsed; splits is None on failure"""
+        paths = {rel: os.path.join(self.docs_dir, rel) for rel in rels}
+        workers = min(self.ingest_workers, len(rels))
+        if workers <= 1:
+            for rel, path in paths.items():
+                try:
+                    yield rel, _parse_and_split(path)
+                except Exception as e:
+                    self.logger.error(f"Failed to load {rel}: {str(e)}")
+                    yield rel, None
+            return
+
+        # Not forked: this runs on a loader thread while other threads load models
+        with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as pool:
+            futures = {pool.submit(_parse_and_split, path): rel for rel, path in paths.items()}
+            for future in as_completed(futures):
+                rel = futures[future]
+                try:
+                    yield rel, future.result()
+                except Exception as e:
+                    self.logger.error(f"Failed to load {rel}: {str(e)}")
+                    yield rel, None
+
+    def _ingest(self, db: Optional[FAISS], rels: List[str], files: Dict[str, Dict]) -> Optional[FAISS]:
+        """Stream parsed chunks into the index in embedding batches.
+
+        Files are parsed in a process pool; while workers are still parsing,
+        the chunks that already arrived are embedded and added to the index.
+        """
+        pending: List[Tuple[Document, str]] = []
+
+        def embed(batch: List[Tuple[Document, str]]):
+            nonlocal db
+            texts = [doc.page_content for doc, _ in batch]
+            vectors = self.embeddings.embed_documents(texts)
+            metadatas = [doc.metadata for doc, _ in batch]
+            ids = [chunk_id for _, chunk_id in batch]
+            if db is None:
+                db = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings,
+                                           metadatas=metadatas, ids=ids)
+            else:
+                db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+
+        for rel, splits in self._parsed_docs(rels):
+            if splits is None:
+                # Remember the failure so the watcher does not re-parse it until the file changes
+                files[rel]["ids"] = []
+                files[rel]["failed"] = True
+                continue
+            ids = self._assign_ids(rel, files[rel]["sha256"], splits)
+            files[rel]["ids"] = ids
+            pending.extend(zip(splits, ids))
+            while len(pending) >= self.embed_batch_size:
+                embed(pending[:self.embed_batch_size])
+                del pending[:self.embed_batch_size]
+
+        if pending:
+            embed(pending)
+        return db
+
+    def _diff_docs(self, manifest: Dict) -> Tuple[Dict[str, Dict], List[str], List[str]]:
+        """Compare docs_dir against the manifest.
+
+        Returns the new file table (with hashes), the relative paths that need
+        re-embedding and the chunk IDs that must be removed from the index.
+        """
+        old_files = manifest.get("files", {})
+        files, changed, stale_ids = {}, [], []
+
+        for rel, info in self._scan_docs().items():
+            old = old_files.get(rel)
+            if old and old["size"] == info["size"] and old["mtime"] == info["mtime"]:
+                files[rel] = old
+                continue
+
+            sha = self._hash_file(os.path.join(self.docs_dir, rel))
+            if old and old["sha256"] == sha and not old.get("failed"):
+                files[rel] = {**old, **info}
+                continue
+
+            if old:
+                stale_ids.extend(old["ids"])
+            files[rel] = {**info, "sha256": sha, "ids": []}
+            changed.append(rel)
+
+        for rel, old in old_files.items():
+            if rel not in files:
+                stale_ids.extend(old["ids"])
+        return files, changed, stale_ids
+
+    def _sync_index(self, db: Optional[FAISS], manifest: Dict) -> Tuple[Optional[FAISS], Dict, bool]:
+        """Bring the index in line with docs_dir"""
+        files, changed, stale_ids = self._diff_docs(manifest)
+
+        if db is not None and stale_ids:
+            db.delete(stale_ids)
+
+        if changed:
+            db = self._ingest(db, changed, files)
+
+        if changed or stale_ids:
+            self.logger.info(f"Re-embedded {len(changed)} document(s), dropped {len(stale_ids)} stale chunk(s)")
+        dirty = files != manifest.get("files")
+        return db, {"files": files}, dirty
+
+    def _load_index(self) -> Tuple[Optional[FAISS], Dict]:
+        """Load the persisted index and manifest, discarding them if inconsistent"""
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            db = FAISS.load_local(self.index_dir, self.embeddings, allow_dangerous_deserialization=True)
+        except FileNotFoundError:
+            return None, {}
         except Exception as e:
-            self.logger.error(f"Vector store init failed: {str(e)}")
-            return FAISS.from_texts(["Error loading documents"], self.embeddings)
+            self.logger.warning(f"Persisted index unreadable, rebuilding: {str(e)}")
+            return None, {}
+
+        if set(db.index_to_docstore_id.values()) != self._chunk_ids(manifest):
+            self.logger.warning("Persisted index does not match manifest, rebuilding")
+            return None, {}
+        return db, manifest
+
+    def _save_index(self, db: FAISS, manifest: Dict):
+        """Persist the index first and the manifest last, so a crash leaves a detectable mismatch"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        db.save_local(self.index_dir)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
 
     def search(self, query: str, k=5) -> List[Dict]:
         """Return structured search results with metadata"""
+        db = self.db  # Pin one index for the whole call
         try:
-            docs = self.db.similarity_search(query, k=k)
+            docs = db.similarity_search(query, k=k)
             return [{
-                "source": os.path.basename(d.metadata['source']),
+                "id": d.metadata.get('chunk_id'),
+                "source": os.path.basename(d.metadata.get('source', 'N/A')),
                 "content": d.page_content[:700].strip(),
                 "page": d.metadata.get('page', 'N/A'),
                 "score": float(d.metadata.get('score', 0))
             } for d in docs]
-            
+
         except Exception as e:
             self.logger.error(f"Search error: {str(e)}")
             return []
-        
\ No newline at end of file
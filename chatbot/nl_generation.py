@@ -1,84 +1,222 @@
-from transformers import pipeline, AutoTokenizer
+from transformers import (pipeline, AutoTokenizer, AutoModelForSeq2SeqLM, TextIteratorStreamer,
+                          StoppingCriteria, StoppingCriteriaList)
+import transformers
+import torch
+import gc
+import io
+import os
+import time
 import logging
 import re
-from typing import List, Dict
+import queue
+import threading
+from typing import List, Dict, Iterator, Optional, Union
+from chatbot.batching import GenerationScheduler
+from chatbot.context import ContextAssembler
+
+RAG_PROMPT_PREFIX = """Generate precise response using these documents:
+
+            USER QUERY: {query}
+
+            RELEVANT DOCUMENTS:"""
+
+RAG_PROMPT_SUFFIX = """
+
+            RESPONSE REQUIREMENTS:
+            1. Strictly use information from provided documents
+            2. Acknowledge when info is unavailable
+            3. Format with headers, bullets, and code blocks
+            4. Reference sources like [1], [2]
+            5. Never invent technical details
+
+            TECHNICAL RESPONSE:"""
+
+class _StopOnEvent(StoppingCriteria):
+    """Ends generation at the next token once ``event`` is set"""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
 
 class ResponseGenerator:
-    def __init__(self):
+    FALLBACK_ANSWER = "I need to verify the documentation. Could you please rephrase your question?"
+
+    def __init__(self, quantize: bool = False, cache_dir: str = "./model_cache",
+                 max_batch_size: int = 8, batch_wait_ms: float = 20):
         self.logger = logging.getLogger(__name__)
         self.model_name = "google/flan-t5-large"
+        self.cache_dir = cache_dir
+        self.quantize = quantize
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = self._load_model()
         self.generator = pipeline(
             "text2text-generation",
-            model="google/flan-t5-large",
+            model=self.model,
+            tokenizer=self.tokenizer,
             device=-1,  # CPU
             truncation=True,
             do_sample=True,  # Required for temperature
             max_new_tokens=800,
-            temperature=0.4,
-            model_kwargs={
-            "cache_dir": "./model_cache",
-        }
+            temperature=0.4
+        )
+        self.context_assembler = ContextAssembler(
+            self.tokenizer, RAG_PROMPT_PREFIX, RAG_PROMPT_SUFFIX, clean=self._clean_content
+        )
+        self.humanize_prefix_ids = self.tokenizer.encode(
+            "Simplify this technical message: ", add_special_tokens=False
+        )
+        self.scheduler = GenerationScheduler(
+            self._generate_batch, max_batch_size=max_batch_size, max_wait_ms=batch_wait_ms
         )
-        
-    def _chunk_text(self, text: str, max_tokens: int = 400) -> List[str]:
-        """Split text into model-safe chunks"""
-        tokens = self.tokenizer.encode(text, add_special_tokens=False)
-        return [self.tokenizer.decode(tokens[i:i+max_tokens]) 
-                for i in range(0, len(tokens), max_tokens)]
-# {context[:4000]}
-    def enhance_rag_response(self, query: str, rag_results: List[Dict]) -> str:
-        try:
-            # Filter and format context
-            context = "\n".join(
-                f"[Document {i+1}]: {self._clean_content(res['content'])}"
-                for i, res in enumerate(self._filter_results(rag_results, query))
-            )
-        
-            prompt = f"""Generate precise response using these documents:
 
-            USER QUERY: {query}
+    def _generate_batch(self, inputs: List[Union[str, List[int]]], batch_size: int, **generate_kwargs) -> List[Dict]:
+        """Run one padded batch; token-ID prompts bypass the pipeline's tokenizer"""
+        if isinstance(inputs[0], str):
+            return self.generator(inputs, batch_size=batch_size, **generate_kwargs)
 
-            RELEVANT DOCUMENTS:
-            {context}
+        encoded = self.tokenizer.pad({"input_ids": inputs}, return_tensors="pt")
+        with torch.no_grad():
+            # Same sampling defaults the pipeline was built with
+            outputs = self.model.generate(**encoded, **{"do_sample": True, "temperature": 0.4, **generate_kwargs})
+        return [
+            {"generated_text": text}
+            for text in self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        ]
 
-            RESPONSE REQUIREMENTS:
-            1. Strictly use information from provided documents
-            2. Acknowledge when info is unavailable
-            3. Format with headers, bullets, and code blocks
-            4. Reference sources like [1], [2]
-            5. Never invent technical details
+    def _quantized_path(self) -> str:
+        # Pickled quantized modules are tied to the library versions that produced them
+        name = self.model_name.replace("/", "__")
+        return os.path.join(
+            self.cache_dir, f"{name}-int8-torch{torch.__version__}-tf{transformers.__version__}.pt"
+        )
 
-            TECHNICAL RESPONSE:"""
+    def _load_model(self):
+        """Load flan-t5 in fp32, or int8 dynamic-quantized when enabled"""
+        if not self.quantize:
+            return AutoModelForSeq2SeqLM.from_pretrained(self.model_name, cache_dir=self.cache_dir)
+
+        path = self._quantized_path()
+        if os.path.exists(path):
+            try:
+                model = torch.load(path, weights_only=False)
+                self.logger.info(f"Loaded quantized generator from {path}")
+                return model.eval()
+            except Exception as e:
+                self.logger.warning(f"Quantized cache unreadable, re-quantizing: {str(e)}")
+
+        model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name, cache_dir=self.cache_dir)
+        model = torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        torch.save(model, tmp_path)
+        os.replace(tmp_path, path)
+        return model
+
+    @staticmethod
+    def model_size_mb(model) -> float:
+        """Serialized state_dict size; counts packed int8 weights that parameters() misses"""
+        buffer = io.BytesIO()
+        torch.save(model.state_dict(), buffer)
+        return buffer.tell() / 1e6
+
+    def close(self):
+        """Stop the batching thread so the model can be freed"""
+        self.scheduler.close()
+
+    def _chunk_ids(self, text: str, max_tokens: int = 400) -> List[List[int]]:
+        """Split text into model-safe token ID chunks"""
+        tokens = self.tokenizer.encode(text, add_special_tokens=False)
+        return [tokens[i:i+max_tokens] for i in range(0, len(tokens), max_tokens)]
+
+    def _build_rag_input(self, query: str, rag_results: List[Dict]) -> List[int]:
+        """Prompt token IDs for the two most relevant chunks, packed to the encoder budget"""
+        return self.context_assembler.assemble(query, self._filter_results(rag_results, query))
+
+    def enhance_rag_response(self, query: str, rag_results: List[Dict]) -> str:
+        try:
+            input_ids = self._build_rag_input(query, rag_results)
         
-            response = self.generator(
-                prompt,
+            # Concurrent requests are micro-batched into one padded generation call
+            response = self.scheduler.generate(
+                input_ids,
                 max_new_tokens=800,
                 temperature=0.4,  # Reduced for less randomness
                 do_sample=True,
                 num_beams=4,
                 repetition_penalty=1.2,  # Reduce repetition
                 no_repeat_ngram_size=3
-            )[0]['generated_text']
+            )
         
             return self._format_response(response)
 
         except Exception as e:
             self.logger.error(f"Generation error: {str(e)}")
-            return "I need to verify the documentation. Could you please rephrase your question?"
+            return self.FALLBACK_ANSWER
+
+    def stream_rag_response(self, query: str, rag_results: List[Dict], token_timeout: float = 60) -> Iterator[str]:
+        """Yield generated text incrementally as the decoder produces it.
+
+        Streamers do not support beam search, so this variant samples with a
+        single beam using the same temperature and repetition settings.
+        Errors in the generation thread are re-raised here, and a stall of
+        more than ``token_timeout`` seconds raises TimeoutError. If the
+        consumer stops early (timeout, or the client disconnecting and the
+        generator being closed), generation is stopped at the next token.
+        """
+        input_ids = torch.tensor([self._build_rag_input(query, rag_results)])
+        streamer = TextIteratorStreamer(self.tokenizer, skip_special_tokens=True, timeout=token_timeout)
+        errors: List[BaseException] = []
+        stop = threading.Event()
+
+        def generate():
+            try:
+                self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    streamer=streamer,
+                    max_new_tokens=800,
+                    temperature=0.4,
+                    do_sample=True,
+                    repetition_penalty=1.2,
+                    no_repeat_ngram_size=3,
+                    stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop)])
+                )
+            except BaseException as e:
+                errors.append(e)
+                streamer.end()  # Unblock the consumer
+
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        except queue.Empty:
+            raise TimeoutError(f"No generated text for {token_timeout:.0f}s")
+        finally:
+            stop.set()  # No-op after a normal finish; otherwise frees the model for the next request
+        thread.join()
+        if errors:
+            raise errors[0]
 
     def _clean_content(self, text: str) -> str:
         """Remove code comments and special characters - NO TRUNCATION NOW"""
         return re.sub(r'\/\/.*?\n', '', text).strip()
 
-    def _filter_results(self, results: List[Dict], query: str) -> List[Dict]:
+    def _filter_results(self, results: List[Dict], query: str, limit: Optional[int] = 2) -> List[Dict]:
         """Filter RAG results by query relevance"""
         keywords = set(query.lower().split())
         return sorted(
             results,
             key=lambda x: sum(1 for kw in keywords if kw in x['content'].lower()),
             reverse=True
-        )[:2]  # Use top 2 most relevant
+        )[:limit]  # Use top most relevant
+
+    def format_response(self, text: str) -> str:
+        """Format a fully streamed answer the same way as enhance_rag_response"""
+        return self._format_response(text)
 
     def _format_response(self, text: str) -> str:
         """Clean and structure generated text"""
@@ -95,13 +233,53 @@ class ResponseGenerator:
     
         return text.strip()[:2000]
 
-    def humanize(self, technical_text: str) -> str:
-        chunks = self._chunk_text(technical_text)
-        response = []
-        for chunk in chunks:
-            result = self.generator(
-                f"Simplify this technical message: {chunk}",
-                max_new_tokens=150
+    # Markers of output that still needs simplifying: code, tracebacks, tables, paths, hex
+    TECHNICAL_PATTERN = re.compile(r'```|Traceback|Exception|Error|\||[{}<>]|[A-Za-z]:\\|/\w+/|0x[0-9a-fA-F]+')
+
+    def _is_plain(self, text: str, max_tokens: int = 48) -> bool:
+        """Short text without technical markers is returned as-is"""
+        if len(text) > max_tokens * 8 or self.TECHNICAL_PATTERN.search(text):
+            return False
+        return len(self.tokenizer.encode(text, add_special_tokens=False)) <= max_tokens
+
+    def humanize(self, technical_text: str, max_chunks: int = 8) -> str:
+        if self._is_plain(technical_text):
+            return technical_text.strip()
+
+        chunks = self._chunk_ids(technical_text)
+        if len(chunks) > max_chunks:
+            self.logger.warning(f"Humanize input truncated from {len(chunks)} to {max_chunks} chunks")
+            chunks = chunks[:max_chunks]
+
+        # Submit every chunk before waiting so the scheduler runs them as one padded batch
+        futures = [
+            self.scheduler.submit(
+                self.humanize_prefix_ids + chunk + [self.tokenizer.eos_token_id], max_new_tokens=150
             )
-            response.append(result[0]['generated_text'])
-        return self._format_response(" ".join(response))
\ No newline at end of file
+            for chunk in chunks
+        ]
+        response = [future.result() for future in futures]
+        return self._format_response(" ".join(response))
+
+def compare_precisions(prompt: str = "Explain what a transformer encoder does.", runs: int = 3) -> Dict[str, Dict[str, float]]:
+    """Compare generation latency and model size of the fp32 and int8 generators"""
+    results = {}
+    for quantize in (False, True):
+        generator = ResponseGenerator(quantize=quantize)
+        generator.generator(prompt, max_new_tokens=32)  # Warm-up
+        start = time.perf_counter()
+        for _ in range(runs):
+            generator.generator(prompt, max_new_tokens=64, do_sample=False)
+        results["int8" if quantize else "fp32"] = {
+            "latency_s": (time.perf_counter() - start) / runs,
+            "model_mb": ResponseGenerator.model_size_mb(generator.model)
+        }
+        # The scheduler thread holds the pipeline, so stop it before dropping the model
+        generator.close()
+        del generator
+        gc.collect()
+    return results
+
+if __name__ == "__main__":
+    for precision, stats in compare_precisions().items():
+        print(f"{precision}: {stats['latency_s']:.2f}s per generation | {stats['model_mb']:.0f}MB")
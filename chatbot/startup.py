@@ -0,0 +1,97 @@
+# chatbot/startup.py
+import time
+import logging
+import threading
+import multiprocessing
+from typing import Any, Callable, Dict, Iterable, Optional
+
+def process_context():
+    """Multiprocessing context for worker processes started while loader threads run.
+
+    Forking a multithreaded process can deadlock the child, so this is
+    forkserver where available (the main module is imported once by the
+    server, not per worker) and spawn elsewhere.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+class ComponentNotReady(RuntimeError):
+    """Raised when a component is requested before it finished loading"""
+
+class ComponentRegistry:
+    """Loads heavy components in background threads and tracks their readiness.
+
+    Each component is built by a factory once the components it requires
+    are ready, so independent models load in parallel while the web server
+    is already accepting connections.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._factories: Dict[str, tuple] = {}
+        self._components: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_times: Dict[str, float] = {}
+        self._events: Dict[str, threading.Event] = {}
+
+    def register(self, name: str, factory: Callable[..., Any], requires: Iterable[str] = ()):
+        """Declare a component; its factory receives the required components in order"""
+        self._factories[name] = (factory, tuple(requires))
+        self._events[name] = threading.Event()
+
+    def start(self):
+        """Start one loader thread per registered component"""
+        for name in self._factories:
+            threading.Thread(target=self._load, args=(name,), name=f"load-{name}", daemon=True).start()
+
+    def _load(self, name: str):
+        factory, requires = self._factories[name]
+        try:
+            deps = [self.get(dep, timeout=None) for dep in requires]
+            start = time.time()
+            self._components[name] = factory(*deps)
+            self._load_times[name] = time.time() - start
+            self.logger.info(f"Component '{name}' ready in {self._load_times[name]:.1f}s")
+        except Exception as e:
+            self._errors[name] = str(e)
+            self.logger.error(f"Component '{name}' failed to load: {str(e)}")
+        finally:
+            self._events[name].set()
+
+    def get(self, name: str, timeout: Optional[float] = 0) -> Any:
+        """Return a loaded component, waiting up to ``timeout`` seconds (None waits forever)"""
+        self._events[name].wait(timeout)
+        if name in self._components:
+            return self._components[name]
+        if name in self._errors:
+            raise ComponentNotReady(f"{name} failed to load: {self._errors[name]}")
+        raise ComponentNotReady(f"{name} is still loading")
+
+    def is_ready(self, *names: str) -> bool:
+        return all(name in self._components for name in names)
+
+    def proxy(self, name: str, timeout: Optional[float] = None) -> "ComponentProxy":
+        return ComponentProxy(self, name, timeout)
+
+    def status(self) -> Dict[str, Dict]:
+        """Per-component readiness report"""
+        report = {}
+        for name in self._factories:
+            if name in self._components:
+                report[name] = {"status": "ready", "load_seconds": round(self._load_times[name], 2)}
+            elif name in self._errors:
+                report[name] = {"status": "failed", "error": self._errors[name]}
+            else:
+                report[name] = {"status": "loading"}
+        return report
+
+class ComponentProxy:
+    """Stand-in that resolves to a registry component on first attribute access"""
+
+    def __init__(self, registry: ComponentRegistry, name: str, timeout: Optional[float]):
+        self._registry = registry
+        self._name = name
+        self._timeout = timeout
+
+    def __getattr__(self, attr: str):
+        return getattr(self._registry.get(self._name, timeout=self._timeout), attr)
@@ -0,0 +1,190 @@
+# chatbot/worker_pool.py
+import io
+import os
+import sys
+import time
+import queue
+import logging
+import traceback
+from typing import Dict, Iterable, List
+from chatbot.startup import process_context
+
+# Heavy libraries the diagnostic scripts share; imported once per worker
+PREWARM_MODULES = ("numpy", "psutil", "matplotlib", "matplotlib.pyplot", "speedtest",
+                   "PIL.Image", "imagehash", "sklearn.cluster")
+
+class _PipeWriter(io.TextIOBase):
+    """stdout replacement that forwards complete lines to the parent"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = ""
+
+    def write(self, text: str) -> int:
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            self.conn.send(("out", line + "\n"))
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            self.conn.send(("out", self.buffer))
+            self.buffer = ""
+
+def _worker_main(conn, scripts: List[str], prewarm: Iterable[str]):
+    """Worker loop: pre-import libraries, compile scripts once, then run jobs"""
+    os.environ.setdefault("MPLBACKEND", "Agg")  # Workers are headless
+    for name in prewarm:
+        try:
+            __import__(name)
+        except Exception:
+            pass
+
+    compiled: Dict[str, object] = {}
+    for path in scripts:
+        try:
+            with open(path) as f:
+                compiled[path] = compile(f.read(), path, "exec")
+        except Exception:
+            pass
+
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:  # The pool went away without retiring this worker
+            return
+        if path is None:
+            return
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = _PipeWriter(conn), io.StringIO()
+        code = 0
+        try:
+            if path not in compiled:
+                with open(path) as f:
+                    compiled[path] = compile(f.read(), path, "exec")
+            exec(compiled[path], {"__name__": "__main__", "__file__": path})
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            captured = sys.stderr.getvalue()
+            sys.stdout, sys.stderr = stdout, stderr
+        try:
+            import matplotlib.pyplot as plt
+            plt.close("all")
+        except Exception:
+            pass
+        conn.send(("done", code, captured))
+
+class _Worker:
+    def __init__(self, ctx, scripts: List[str], prewarm: Iterable[str]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, scripts, tuple(prewarm)), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs_done = 0
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def retire(self):
+        try:
+            self.conn.send(None)
+            self.process.join(1)
+        except Exception:
+            pass
+        self.kill()
+
+class ScriptWorkerPool:
+    """Long-lived, pre-warmed worker processes that run scripts in-process.
+
+    Each worker imports the shared heavy libraries and compiles the pooled
+    scripts once, then executes a script's ``__main__`` block per job with
+    stdout streamed back line by line. A worker is replaced after
+    ``max_jobs_per_worker`` jobs, on crash, and when a job times out or is
+    cancelled, so one job's state cannot leak into the next for long.
+    """
+
+    def __init__(self, scripts: Iterable[str], size: int = 2, max_jobs_per_worker: int = 50,
+                 prewarm: Iterable[str] = PREWARM_MODULES):
+        self.logger = logging.getLogger(__name__)
+        self.scripts = [os.path.abspath(s) for s in scripts]
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.prewarm = tuple(prewarm)
+        # Never fork: the pool is created while loader, sampler and scheduler threads are running
+        self._ctx = process_context()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.scripts, self.prewarm)
+
+    def handles(self, script_path: str) -> bool:
+        return os.path.abspath(script_path) in self.scripts
+
+    def run(self, job, timeout: float):
+        """Execute ``job`` on a pooled worker, filling in its output and status"""
+        worker = self._idle.get()
+        deadline = time.monotonic() + timeout
+        healthy = True
+        try:
+            if not worker.process.is_alive():
+                worker.kill()
+                worker = self._spawn()
+            job.started_at = time.time()
+            job.status = "running"
+            worker.conn.send(job.script_path)
+
+            while True:
+                if job._cancel_requested:
+                    healthy = False
+                    job._finish("cancelled")
+                    return
+                if time.monotonic() > deadline:
+                    healthy = False
+                    job._finish("timeout")
+                    return
+                if not worker.conn.poll(0.1):
+                    if not worker.process.is_alive():
+                        raise EOFError("worker exited")
+                    continue
+
+                message = worker.conn.recv()
+                if message[0] == "out":
+                    job._append(message[1])
+                elif message[0] == "done":
+                    job.returncode, job.stderr = message[1], message[2]
+                    job._finish("succeeded" if job.returncode == 0 else "failed")
+                    return
+
+        except (EOFError, OSError):
+            healthy = False
+            worker.process.join(1)
+            self.logger.error(
+                f"Script worker crashed running {job.script_path} (exit code {worker.process.exitcode})"
+            )
+            job.error = "Execution error: worker process crashed"
+            job._finish("failed")
+        finally:
+            worker.jobs_done += 1
+            if not healthy:
+                worker.kill()
+                worker = self._spawn()
+            elif worker.jobs_done >= self.max_jobs_per_worker:
+                worker.retire()
+                worker = self._spawn()
+            self._idle.put(worker)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get().retire()
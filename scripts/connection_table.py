@@ -0,0 +1,120 @@
+# scripts/connection_table.py
+import time
+import threading
+import psutil
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (socket type, local ip, local port, remote ip, remote port, pid)
+ConnKey = Tuple[int, str, int, str, int, Optional[int]]
+
+@dataclass
+class ConnectionDiff:
+    """Changes between two consecutive ticks"""
+    opened: List[ConnKey] = field(default_factory=list)
+    closed: List[ConnKey] = field(default_factory=list)
+    changed: List[Tuple[ConnKey, str, str]] = field(default_factory=list)  # (key, old status, new status)
+
+class ConnectionTable:
+    """Incrementally maintained table of the host's inet connections.
+
+    Each ``update`` keys the fresh ``psutil.net_connections`` result against
+    the previous tick and applies only the differences (opened, closed and
+    status changes) to the per-status and per-remote-host counters, so the
+    aggregates never require rescanning the table.
+    """
+
+    def __init__(self, kind: str = "inet", top_remotes: int = 10):
+        self.kind = kind
+        self.top_remotes = top_remotes
+        self.rows: Dict[ConnKey, str] = {}  # key -> status
+        self.status_counts: Counter = Counter()
+        self.remote_counts: Counter = Counter()
+        self.ticks = 0
+        self.total_opened = 0
+        self.total_closed = 0
+        self.last_diff = ConnectionDiff()
+        self.updated_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(conn) -> ConnKey:
+        laddr, raddr = conn.laddr, conn.raddr
+        return (
+            int(conn.type),
+            laddr.ip if laddr else "", laddr.port if laddr else 0,
+            raddr.ip if raddr else "", raddr.port if raddr else 0,
+            conn.pid
+        )
+
+    def _count(self, key: ConnKey, status: str, delta: int):
+        self.status_counts[status] += delta
+        if not self.status_counts[status]:
+            del self.status_counts[status]
+        if key[3]:
+            self.remote_counts[key[3]] += delta
+            if not self.remote_counts[key[3]]:
+                del self.remote_counts[key[3]]
+
+    def update(self, connections: Optional[Iterable] = None) -> ConnectionDiff:
+        """Apply one tick; ``connections`` defaults to a fresh ``psutil.net_connections``"""
+        if connections is None:
+            connections = psutil.net_connections(kind=self.kind)
+        current = {self._key(conn): conn.status for conn in connections}
+
+        with self._lock:
+            diff = ConnectionDiff()
+            for key, status in current.items():
+                old = self.rows.get(key)
+                if old is None:
+                    diff.opened.append(key)
+                    self._count(key, status, 1)
+                elif old != status:
+                    diff.changed.append((key, old, status))
+                    self._count(key, old, -1)
+                    self._count(key, status, 1)
+            for key, status in self.rows.items():
+                if key not in current:
+                    diff.closed.append(key)
+                    self._count(key, status, -1)
+
+            self.rows = current
+            if self.ticks:  # The first tick only seeds the table
+                self.total_opened += len(diff.opened)
+            self.ticks += 1
+            self.total_closed += len(diff.closed)
+            self.last_diff = diff
+            self.updated_at = time.time()
+        return diff
+
+    @property
+    def total(self) -> int:
+        return len(self.rows)
+
+    def aggregates(self, status: Optional[str] = None) -> Dict:
+        """JSON-ready summary; ``status`` narrows the totals to one connection status"""
+        with self._lock:
+            diff = self.last_diff
+            if status:
+                remotes = Counter(key[3] for key, s in self.rows.items() if s == status and key[3])
+                by_status = {status: self.status_counts.get(status, 0)}
+            else:
+                remotes = self.remote_counts
+                by_status = dict(self.status_counts)
+            return {
+                "updated_at": self.updated_at,
+                "ticks": self.ticks,
+                "total": sum(by_status.values()),
+                "by_status": by_status,
+                "top_remote_hosts": [
+                    {"ip": ip, "connections": count} for ip, count in remotes.most_common(self.top_remotes)
+                ],
+                "last_tick": {
+                    "opened": len(diff.opened),
+                    "closed": len(diff.closed),
+                    "changed": len(diff.changed)
+                },
+                "total_opened": self.total_opened,
+                "total_closed": self.total_closed
+            }
@@ -0,0 +1,135 @@
+# scripts/connectivity.py
+import os
+import time
+import socket
+import bisect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Endpoint = Tuple[str, int]
+
+DEFAULT_ENDPOINTS: Tuple[Endpoint, ...] = (
+    ("8.8.8.8", 53),  # Google DNS
+    ("1.1.1.1", 53),  # Cloudflare DNS
+    ("208.67.222.222", 53)  # OpenDNS
+)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2000)
+
+def endpoints_from_env(var: str = "CONNECTIVITY_ENDPOINTS") -> Tuple[Endpoint, ...]:
+    """Parse ``host:port,host:port`` from the environment, falling back to the defaults"""
+    value = os.environ.get(var, "").strip()
+    if not value:
+        return DEFAULT_ENDPOINTS
+    endpoints = []
+    for item in value.split(","):
+        host, _, port = item.strip().rpartition(":")
+        if host and port.isdigit():
+            endpoints.append((host.strip("[]"), int(port)))
+        else:
+            logger.error(f"Ignoring malformed connectivity endpoint: {item!r}")
+    return tuple(endpoints) or DEFAULT_ENDPOINTS
+
+@dataclass
+class ProbeResult:
+    """Outcome of one connectivity check"""
+    online: bool
+    endpoint: Optional[str]  # First endpoint that answered
+    latency_ms: Optional[float]
+    checked_at: float
+
+class ConnectivityProber:
+    """Concurrent TCP reachability check over a list of endpoints.
+
+    All endpoints are dialled at once and the check returns as soon as one
+    connects, so an offline host is detected after a single ``timeout``
+    rather than one per endpoint. Results are cached for ``ttl`` seconds and
+    concurrent callers share one probe. Every attempt, including those that
+    finish after the winner, is recorded in a per-endpoint latency histogram.
+    """
+
+    def __init__(self, endpoints: Sequence[Endpoint] = DEFAULT_ENDPOINTS, timeout: float = 2.0, ttl: float = 10.0):
+        self.endpoints = [(host, int(port)) for host, port in endpoints]
+        self.timeout = timeout
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.endpoints)), thread_name_prefix="probe")
+        self._probe_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._last: Optional[ProbeResult] = None
+        self._histograms: Dict[str, List[int]] = {
+            self._label(ep): [0] * (len(LATENCY_BUCKETS_MS) + 1) for ep in self.endpoints
+        }
+        self._failures: Dict[str, int] = {self._label(ep): 0 for ep in self.endpoints}
+
+    @staticmethod
+    def _label(endpoint: Endpoint) -> str:
+        return f"{endpoint[0]}:{endpoint[1]}"
+
+    def _attempt(self, endpoint: Endpoint) -> Optional[float]:
+        """Connect once; return the latency in ms or None on failure"""
+        label = self._label(endpoint)
+        start = time.perf_counter()
+        try:
+            with socket.create_connection(endpoint, timeout=self.timeout):
+                latency = (time.perf_counter() - start) * 1000
+        except OSError:
+            with self._stats_lock:
+                self._failures[label] += 1
+            return None
+        with self._stats_lock:
+            self._histograms[label][bisect.bisect_left(LATENCY_BUCKETS_MS, latency)] += 1
+        return latency
+
+    def probe(self, force: bool = False) -> ProbeResult:
+        """Return the cached result if fresh, otherwise dial every endpoint concurrently"""
+        with self._probe_lock:
+            last = self._last
+            if not force and last is not None and time.time() - last.checked_at < self.ttl:
+                return last
+
+            result = ProbeResult(False, None, None, time.time())
+            pending = {self._executor.submit(self._attempt, ep): ep for ep in self.endpoints}
+            deadline = time.monotonic() + self.timeout
+            while pending:
+                done, _ = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    endpoint = pending.pop(future)
+                    latency = future.result()
+                    if latency is not None:
+                        result = ProbeResult(True, self._label(endpoint), round(latency, 1), result.checked_at)
+                        break
+                if result.online:
+                    break
+            # Stragglers finish on the pool within their own timeout and still feed the histograms
+            self._last = result
+            return result
+
+    def status(self) -> str:
+        return "Online" if self.probe().online else "Offline"
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-endpoint latency histograms (bucket upper bounds in ms) and failure counts"""
+        with self._stats_lock:
+            endpoints = {
+                label: {"histogram": list(counts), "failures": self._failures[label]}
+                for label, counts in self._histograms.items()
+            }
+        last = self._last
+        return {
+            "buckets_ms": list(LATENCY_BUCKETS_MS) + [None],
+            "endpoints": endpoints,
+            "last": None if last is None else {
+                "online": last.online,
+                "endpoint": last.endpoint,
+                "latency_ms": last.latency_ms,
+                "checked_at": last.checked_at
+            }
+        }
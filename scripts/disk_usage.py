@@ -0,0 +1,151 @@
+# scripts/disk_usage.py
+import os
+import stat
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class DiskUsage:
+    """Recursive usage of one directory tree"""
+    path: str
+    size: int
+    files: int
+    complete: bool  # False when the depth or time budget cut the walk short
+    children: Dict[str, int] = field(default_factory=dict)  # Immediate subdirectory -> total bytes
+
+@dataclass
+class _DirEntry:
+    mtime: float
+    size: int  # Regular files with a single link
+    files: int
+    hardlinks: Tuple[Tuple[Tuple[int, int], int], ...]  # ((st_dev, st_ino), size) for multiply linked files
+    subdirs: Tuple[str, ...]
+
+class DiskUsageScanner:
+    """Parallel, cached directory-size engine.
+
+    Directories are listed concurrently on a thread pool. Files with several
+    hard links are counted once per scan by (device, inode). Each directory's
+    own listing is cached by path and mtime, so a repeated scan re-lists only
+    directories whose entries changed and just stats the rest. In-place
+    growth of an existing file does not change its directory's mtime, so
+    cached totals can lag until the directory itself changes.
+    """
+
+    def __init__(self, max_workers: int = 8, one_filesystem: bool = True, max_cache_entries: int = 200000):
+        self.max_workers = max_workers
+        self.one_filesystem = one_filesystem
+        self.max_cache_entries = max_cache_entries
+        self._cache: Dict[str, _DirEntry] = {}
+        self._cache_lock = threading.Lock()
+
+    def _list_dir(self, path: str, mtime: float, root_dev: int) -> _DirEntry:
+        size = files = 0
+        hardlinks: List[Tuple[Tuple[int, int], int]] = []
+        subdirs: List[str] = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(st.st_mode):
+                    if not self.one_filesystem or st.st_dev == root_dev:
+                        subdirs.append(entry.path)
+                elif stat.S_ISREG(st.st_mode):
+                    files += 1
+                    if st.st_nlink > 1:
+                        hardlinks.append(((st.st_dev, st.st_ino), st.st_size))
+                    else:
+                        size += st.st_size
+        return _DirEntry(mtime, size, files, tuple(hardlinks), tuple(subdirs))
+
+    def _entry(self, path: str, root_dev: int) -> Optional[_DirEntry]:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        with self._cache_lock:
+            cached = self._cache.get(path)
+        if cached is not None and cached.mtime == mtime:
+            return cached
+        try:
+            entry = self._list_dir(path, mtime, root_dev)
+        except OSError as e:
+            logger.debug(f"Cannot list {path}: {str(e)}")
+            return None
+        with self._cache_lock:
+            if len(self._cache) >= self.max_cache_entries:
+                self._cache.clear()
+            self._cache[path] = entry
+        return entry
+
+    def scan(self, root: str, max_depth: Optional[int] = None, time_budget: Optional[float] = None) -> DiskUsage:
+        """Total ``root`` recursively, stopping below ``max_depth`` or after ``time_budget`` seconds"""
+        root = os.path.abspath(root)
+        root_dev = os.stat(root).st_dev
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+
+        listed: Dict[str, _DirEntry] = {}
+        depths: Dict[str, int] = {}  # Depth below root; path separators alone misplace "/" among its children
+        complete = True
+        pending = 0
+        done = threading.Condition()
+
+        def visit(path: str, depth: int):
+            nonlocal pending, complete
+            try:
+                entry = self._entry(path, root_dev)
+                if entry is None:
+                    return
+                with done:
+                    listed[path] = entry
+                    depths[path] = depth
+                    if entry.subdirs and max_depth is not None and depth >= max_depth:
+                        complete = False
+                        return
+                    if deadline is not None and time.monotonic() > deadline:
+                        complete = False
+                        return
+                    pending += len(entry.subdirs)
+                for sub in entry.subdirs:
+                    executor.submit(visit, sub, depth + 1)
+            finally:
+                with done:
+                    pending -= 1
+                    done.notify_all()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with done:
+                pending = 1
+            executor.submit(visit, root, 0)
+            with done:
+                done.wait_for(lambda: pending == 0)
+
+        # Aggregate bottom-up, counting each hard-linked inode once
+        seen: Set[Tuple[int, int]] = set()
+        totals: Dict[str, int] = {}
+        counts: Dict[str, int] = {}
+        for path in sorted(listed, key=depths.__getitem__, reverse=True):
+            entry = listed[path]
+            size, files = entry.size, entry.files
+            for inode, linked_size in entry.hardlinks:
+                if inode not in seen:
+                    seen.add(inode)
+                    size += linked_size
+            for sub in entry.subdirs:
+                size += totals.get(sub, 0)
+                files += counts.get(sub, 0)
+            totals[path], counts[path] = size, files
+
+        root_entry = listed.get(root)
+        children = {
+            os.path.basename(sub): totals.get(sub, 0) for sub in (root_entry.subdirs if root_entry else ())
+        }
+        return DiskUsage(root, totals.get(root, 0), counts.get(root, 0), complete, children)
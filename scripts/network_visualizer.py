@@ -1,25 +1,58 @@
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D  # This import registers the 3D projection
-import psutil
 import time
-from matplotlib.gridspec import GridSpec
-from collections import Counter
+from collections import deque
 
-def visualize_network(filter_status=None, update_interval=1, max_updates=100):
+try:
+    from scripts.connection_table import ConnectionTable
+except ImportError:  # Run directly as scripts/network_visualizer.py
+    from connection_table import ConnectionTable
+
+STATUS_COLORS = {
+    'LISTEN': 'r',
+    'ESTABLISHED': 'g',
+    'TIME_WAIT': 'b'
+}
+
+def summarize_network(table=None, ticks=3, update_interval=1):
     """
-    Visualizes network connections in 3D with live updates and includes a pie chart of connection statuses.
-    
+    Headless sampling: updates the connection table for a few ticks and returns its aggregates.
+
+    Args:
+      table: ConnectionTable to update; a new one is created if omitted.
+      ticks: Number of updates, so the opened/closed counts cover a short window.
+      update_interval: Time in seconds between updates.
+    """
+    table = table or ConnectionTable()
+    for i in range(ticks):
+        if i:
+            time.sleep(update_interval)
+        table.update()
+    return table.aggregates()
+
+def visualize_network(filter_status=None, update_interval=1, max_updates=100, history=30, table=None):
+    """
+    Live plot of the connection table's aggregates: per-status counts over recent ticks in 3D and a status pie chart.
+
     Args:
       filter_status: Optional filter to show only certain connection statuses (e.g., 'LISTEN', 'ESTABLISHED').
       update_interval: Time in seconds between updates.
       max_updates: Maximum number of updates before stopping.
+      history: Number of recent ticks shown in the 3D plot.
+      table: ConnectionTable to update; a new one is created if omitted.
     """
+    # Plotting is an optional consumer of the headless engine
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D  # This import registers the 3D projection
+    from matplotlib.gridspec import GridSpec
+
+    table = table or ConnectionTable()
+    ticks = deque(maxlen=history)  # Per-tick status counts only; individual connections are never drawn
+
     # Create figure with GridSpec: 2 columns, one for the 3D plot, one for the pie chart.
     fig = plt.figure(figsize=(12, 6))
     gs = GridSpec(1, 2, width_ratios=[2, 1])
     ax3d = fig.add_subplot(gs[0], projection='3d')
     ax_pie = fig.add_subplot(gs[1])
-    
+
     update_count = 0
 
     while update_count < max_updates:
@@ -27,74 +60,44 @@ def visualize_network(filter_status=None, update_interval=1, max_updates=100):
         if not plt.fignum_exists(fig.number):
             print("Figure closed by user.")
             break
-        
-        # Retrieve current network connections
-        connections = psutil.net_connections(kind='inet')
-        x_vals, y_vals, z_vals, colors = [], [], [], []
-        labels = []
-        status_list = []
-        
-        for i, conn in enumerate(connections):
-            if filter_status and conn.status != filter_status:
-                continue
-
-            # x: connection index, y: local port, z: remote port (or 0)
-            x_vals.append(i)
-            y_vals.append(conn.laddr.port)
-            z_vals.append(conn.raddr.port if conn.raddr else 0)
-            status_list.append(conn.status)
-            
-            # Set color based on connection status.
-            if conn.status == 'LISTEN':
-                colors.append('r')
-            elif conn.status == 'ESTABLISHED':
-                colors.append('g')
-            elif conn.status == 'TIME_WAIT':
-                colors.append('b')
-            else:
-                colors.append('y')
-            
-            labels.append(f"{conn.laddr.ip}:{conn.laddr.port}\n→ {conn.raddr.ip if conn.raddr else 'N/A'}:"
-                          f"{conn.raddr.port if conn.raddr else 'N/A'}")
-        
+
+        table.update()
+        summary = table.aggregates(status=filter_status)
+        ticks.append(summary["by_status"])
+        statuses = sorted({status for counts in ticks for status in counts})
+
         # Clear previous plots
         ax3d.cla()
         ax_pie.cla()
-        
-        # 3D Scatter plot for network connections.
-        ax3d.scatter(x_vals, y_vals, z_vals, c=colors, s=50)
-        ax3d.set_xlabel('Connection Number')
-        ax3d.set_ylabel('Local Port')
-        ax3d.set_zlabel('Remote Port')
+
+        # 3D bars: tick along x, status along y, connection count as height
+        for y, status in enumerate(statuses):
+            heights = [counts.get(status, 0) for counts in ticks]
+            ax3d.bar3d(range(len(heights)), [y] * len(heights), [0] * len(heights),
+                       0.8, 0.8, heights, color=STATUS_COLORS.get(status, 'y'), alpha=0.7)
+        ax3d.set_yticks(range(len(statuses)))
+        ax3d.set_yticklabels(statuses, fontsize=7)
+        ax3d.set_xlabel('Tick')
+        ax3d.set_zlabel('Connections')
         ax3d.set_title("3D Network Activity")
-        
-        # Add annotations for each connection (optional; may be cluttered if too many).
-        for xi, yi, zi, lab, col in zip(x_vals, y_vals, z_vals, labels, colors):
-            ax3d.text(xi, yi, zi, lab, fontsize=7, color=col)
-        
+
         # Create a status summary text and place it above the 3D plot.
-        counts = Counter(status_list)
-        total = len(status_list)
-        summary_text = f"Total: {total}\n" + "\n".join([f"{status}: {count}" for status, count in counts.items()])
+        last = summary["last_tick"]
+        summary_text = (f"Total: {summary['total']}\n"
+                        f"Opened: {last['opened']}  Closed: {last['closed']}  Changed: {last['changed']}\n"
+                        + "\n".join([f"{status}: {count}" for status, count in summary["by_status"].items()]))
         ax3d.text2D(0.05, 0.95, summary_text, transform=ax3d.transAxes, fontsize=10,
                     verticalalignment='top', bbox=dict(boxstyle="round", facecolor="wheat", alpha=0.5))
-        
+
         # Pie chart for the breakdown of connection statuses.
+        counts = {status: count for status, count in summary["by_status"].items() if count}
         if counts:
-            statuses = list(counts.keys())
-            count_values = list(counts.values())
-            # Define colors matching our scatter plot
-            status_color_map = {
-                'LISTEN': 'r',
-                'ESTABLISHED': 'g',
-                'TIME_WAIT': 'b'
-            }
-            pie_colors = [status_color_map.get(s, 'y') for s in statuses]
-            ax_pie.pie(count_values, labels=statuses, autopct='%1.1f%%', startangle=90, colors=pie_colors)
+            pie_colors = [STATUS_COLORS.get(s, 'y') for s in counts]
+            ax_pie.pie(list(counts.values()), labels=list(counts), autopct='%1.1f%%', startangle=90, colors=pie_colors)
             ax_pie.set_title("Connection Status Breakdown")
         else:
             ax_pie.text(0.5, 0.5, "No Data", ha='center', va='center')
-        
+
         # Draw and pause for update interval.
         plt.draw()
         plt.pause(update_interval)
@@ -105,4 +108,16 @@ def visualize_network(filter_status=None, update_interval=1, max_updates=100):
         plt.close(fig)
 
 if __name__ == "__main__":
-    visualize_network(filter_status=None, update_interval=2, max_updates=50)
+    import matplotlib
+    if matplotlib.get_backend().lower() == 'agg':
+        # Headless (chat worker or server): print the aggregates instead of opening a window
+        summary = summarize_network()
+        print("## Network Connections")
+        print(f"- **Total**: {summary['total']}")
+        for status, count in sorted(summary["by_status"].items(), key=lambda item: -item[1]):
+            print(f"- **{status}**: {count}")
+        print(f"- **Opened / Closed (last {summary['ticks']} ticks)**: {summary['total_opened']} / {summary['total_closed']}")
+        for remote in summary["top_remote_hosts"][:5]:
+            print(f"- **Remote {remote['ip']}**: {remote['connections']} connections")
+    else:
+        visualize_network(filter_status=None, update_interval=2, max_updates=50)
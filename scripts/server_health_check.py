@@ -1,16 +1,26 @@
 # scripts/server_health_check.py (Modified - Outputting Markdown instead of rich console)
 import psutil
 import platform
-import socket
 import time
-import speedtest
-import matplotlib.pyplot as plt
 import os
+import heapq
+import threading
+import json
+import urllib.request
 import numpy as np
 from typing import Tuple, List, Dict, Optional
 from concurrent.futures import ThreadPoolExecutor
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+try:
+    from scripts.connection_table import ConnectionTable
+    from scripts.connectivity import ConnectivityProber, endpoints_from_env
+    from scripts.disk_usage import DiskUsageScanner
+except ImportError:  # Run directly as scripts/server_health_check.py
+    from connection_table import ConnectionTable
+    from connectivity import ConnectivityProber, endpoints_from_env
+    from disk_usage import DiskUsageScanner
 
 # Configure logging (SUPPRESSED for chatbot output)
 # logging.basicConfig(...) # Commented out!
@@ -26,11 +36,96 @@ class SystemMetrics:
     network: Dict[str, Optional[float]]
     gpu: List[str]
     processes: List[Dict[str, str]]
+    disk_usage: Dict = field(default_factory=dict)  # Directory breakdown of the first disk
+
+class ProcessCollector:
+    """Top-N process collector with real CPU deltas.
+
+    Each process is read once per pass inside ``oneshot()``. CPU and I/O are
+    deltas against the previous pass (or a short ``window`` on the first
+    call), and only the top ``n`` survive a bounded heap instead of sorting
+    every process on the host.
+    """
+
+    SORT_KEYS = ("cpu", "rss", "io")
+
+    def __init__(self, window: float = 0.5):
+        self.window = window
+        self._previous: Dict[int, Tuple[float, float, int]] = {}  # pid -> (create_time, cpu_seconds, io_bytes)
+        self._previous_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read(proc: psutil.Process) -> Optional[Tuple[float, float, int, int, str]]:
+        try:
+            with proc.oneshot():
+                times = proc.cpu_times()
+                try:
+                    io = proc.io_counters()
+                    io_bytes = io.read_bytes + io.write_bytes
+                except (psutil.AccessDenied, AttributeError, NotImplementedError):
+                    io_bytes = 0
+                return (proc.create_time(), times.user + times.system, io_bytes,
+                        proc.memory_info().rss, proc.name())
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return None
+
+    def _pass(self) -> Dict[int, Tuple[float, float, int, int, str]]:
+        readings = {}
+        for proc in psutil.process_iter():
+            reading = self._read(proc)
+            if reading is not None:
+                readings[proc.pid] = reading
+        return readings
+
+    def collect(self, n: int = 5, sort_by: str = "cpu") -> Dict[str, list]:
+        """Return the top ``n`` processes by cpu, rss or io as parallel columns"""
+        if sort_by not in self.SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {self.SORT_KEYS}")
+
+        with self._lock:
+            if self._previous_at is None:
+                self._previous, self._previous_at = self._pass(), time.monotonic()
+                time.sleep(self.window)
+            current, now = self._pass(), time.monotonic()
+            previous, elapsed = self._previous, max(now - self._previous_at, 1e-6)
+            self._previous, self._previous_at = {
+                pid: reading[:3] for pid, reading in current.items()
+            }, now
+
+        total_memory = psutil.virtual_memory().total
+
+        def rows():
+            for pid, (created, cpu_seconds, io_bytes, rss, name) in current.items():
+                before = previous.get(pid)
+                if before is None or before[0] != created:  # New process or recycled PID
+                    before = (created, cpu_seconds, io_bytes)
+                yield (pid, name, 100.0 * (cpu_seconds - before[1]) / elapsed, rss,
+                       (io_bytes - before[2]) / elapsed)
+
+        key_index = {"cpu": 2, "rss": 3, "io": 4}[sort_by]
+        top = heapq.nlargest(n, rows(), key=lambda row: row[key_index])
+        return {
+            "pid": [row[0] for row in top],
+            "name": [row[1] for row in top],
+            "cpu_percent": [round(row[2], 1) for row in top],
+            "rss": [row[3] for row in top],
+            "memory_percent": [round(100.0 * row[3] / total_memory, 2) for row in top],
+            "io_bytes_per_sec": [round(row[4], 1) for row in top]
+        }
 
 class SystemHealthMonitor:
     """Comprehensive system health monitoring and reporting tool"""
 
-    def __init__(self):
+    def __init__(self, sampler: Optional["MetricsSampler"] = None, prober: Optional[ConnectivityProber] = None,
+                 speed_test: bool = True, cpu_interval: Optional[float] = 1):
+        self.sampler = sampler  # When set, CPU/memory/disk/network come from its latest snapshot
+        self.cpu_interval = cpu_interval
+        self.prober = prober or ConnectivityProber(endpoints_from_env())
+        self.speed_test = speed_test
+        self.process_collector = ProcessCollector()
+        self.connection_table = ConnectionTable()
+        self.disk_scanner = DiskUsageScanner()
         self.metrics = SystemMetrics(
             system_info={},
             cpu={},
@@ -52,12 +147,12 @@ class SystemHealthMonitor:
             "boot_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(psutil.boot_time()))
         }
 
-    def _get_cpu_metrics(self) -> Dict[str, float]:
-        """Collect CPU-related metrics"""
+    def _get_cpu_metrics(self, interval: Optional[float] = 1) -> Dict[str, float]:
+        """Collect CPU-related metrics (interval=None reads usage since the previous call without blocking)"""
         # Executor context removed here
         freq = psutil.cpu_freq()
         return {
-            "usage_percent": psutil.cpu_percent(interval=1),
+            "usage_percent": psutil.cpu_percent(interval=interval),
             "freq_current": freq.current,
             "freq_max": freq.max,
             "cores_physical": psutil.cpu_count(logical=False),
@@ -85,6 +180,7 @@ class SystemHealthMonitor:
             try:
                 usage = psutil.disk_usage(part.mountpoint)
                 disks[part.device] = {
+                    "mountpoint": part.mountpoint,
                     "total": self._bytes_to_gb(usage.total),
                     "used": self._bytes_to_gb(usage.used),
                     "free": self._bytes_to_gb(usage.free),
@@ -102,35 +198,65 @@ class SystemHealthMonitor:
                 }
         return disks
 
+    def _get_disk_usage(self, path: Optional[str] = None, max_depth: int = 6,
+                        time_budget: float = 10.0) -> Dict:
+        """Size of the first disk's top-level directories, from the cached disk scanner"""
+        if path is None:
+            partitions = psutil.disk_partitions(all=False)
+            path = partitions[0].mountpoint if partitions else os.path.abspath(os.sep)
+        try:
+            usage = self.disk_scanner.scan(path, max_depth=max_depth, time_budget=time_budget)
+        except Exception as e:
+            logger.error(f"Disk scan of {path} failed: {str(e)}")
+            return {}
+        if not usage.complete:
+            logger.info(f"Disk scan of {path} hit its depth/time budget; sizes are lower bounds")
+        return {
+            "path": usage.path,
+            "size": self._bytes_to_gb(usage.size),
+            "files": usage.files,
+            "complete": usage.complete,
+            "children": {name: self._bytes_to_gb(size) for name, size in usage.children.items()}
+        }
+
     def _get_network_metrics(self) -> Dict[str, Optional[float]]:
-        """Collect network metrics with async speed test"""
+        """Collect network metrics, including a speed test when online"""
+        probe = self.prober.probe()
         metrics = {
-            "status": self._check_network_status(),
-            "connections": len(psutil.net_connections()),
+            "status": "Online" if probe.online else "Offline",
+            "probe_endpoint": probe.endpoint,
+            "probe_latency_ms": probe.latency_ms,
+            "connections": self._update_connections(),
             "speed_test": None
         }
 
-        # Initialize executor INSIDE this method, use a 'with' block for local context
-        with ThreadPoolExecutor(max_workers=1) as executor: # Max workers = 1, just for speed test
-            logger.info("Submitting speed test task to executor...") # LOG ADDED
-            executor.submit(self._run_speed_test) # Use local 'executor'
-            logger.info("Speed test task submitted.") # LOG ADDED
-        # Executor implicitly shutdown when exiting 'with' block
+        # Already runs on the collect_metrics pool; skip the speed test when it cannot succeed
+        if self.speed_test and probe.online:
+            results = self._run_speed_test()
+            if results:
+                metrics.update(results, speed_test=True)
 
         return metrics
 
-    def _run_speed_test(self):
-        """Asynchronous speed test execution"""
+    def _update_connections(self) -> int:
+        """Advance the connection table one tick and return the open connection count"""
+        self.connection_table.update()
+        return self.connection_table.total
+
+    def _run_speed_test(self) -> Optional[Dict[str, float]]:
+        """Run a speed test and return download/upload (Mbps) and ping (ms)"""
         try:
+            import speedtest  # Only the standalone report runs speed tests
             st = speedtest.Speedtest()
             st.get_best_server()
-            self.metrics.network.update({
+            return {
                 "download": st.download() / 1e6,
                 "upload": st.upload() / 1e6,
                 "ping": st.results.ping
-            })
+            }
         except Exception as e:
             logger.error(f"Speed test failed: {str(e)}")
+            return None
 
     def _get_gpu_metrics(self) -> List[str]:
         """Collect GPU metrics with fallback"""
@@ -144,35 +270,14 @@ class SystemHealthMonitor:
         except Exception as e:
             return [f"GPU monitoring error: {str(e)}"]
 
-    def _get_process_metrics(self, top_n: int = 5) -> List[Dict[str, str]]:
+    def _get_process_metrics(self, top_n: int = 5, sort_by: str = "cpu") -> List[Dict[str, str]]:
         """Get top resource-consuming processes"""
-        # Executor context removed here
-        procs = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            try:
-                procs.append(proc.info)
-            except psutil.NoSuchProcess:
-                continue
-        return sorted(
-            procs,
-            key=lambda p: p['cpu_percent'] + p['memory_percent'],
-            reverse=True
-        )[:top_n]
+        columns = self.process_collector.collect(n=top_n, sort_by=sort_by)
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
 
     def _check_network_status(self) -> str:
-        """Check internet connectivity with multiple endpoints"""
-        test_servers = [
-            ("8.8.8.8", 53),  # Google DNS
-            ("1.1.1.1", 53),  # Cloudflare DNS
-            ("208.67.222.222", 53)  # OpenDNS
-        ]
-        for server in test_servers:
-            try:
-                socket.create_connection(server, timeout=2)
-                return "Online"
-            except OSError:
-                continue
-        return "Offline"
+        """Check internet connectivity against all endpoints concurrently (cached briefly)"""
+        return self.prober.status()
 
     @staticmethod
     def _bytes_to_gb(value: int) -> float:
@@ -181,37 +286,34 @@ class SystemHealthMonitor:
 
     def collect_metrics(self):
         """Main method to collect all metrics"""
-        # Executor and 'with' block REMOVED from collect_metrics entirely
-
-        logger.info("Collecting system info (main thread)...") # LOG ADDED
-        self.metrics.system_info = self._get_system_info()
-        logger.info("System info collected.") # LOG ADDED
-
-        logger.info("Collecting CPU metrics (main thread)...") # LOG ADDED
-        self.metrics.cpu = self._get_cpu_metrics()
-        logger.info("CPU metrics collected.") # LOG ADDED
-
-        logger.info("Collecting memory metrics (main thread)...") # LOG ADDED
-        self.metrics.memory = self._get_memory_metrics()
-        logger.info("Memory metrics collected.") # LOG ADDED
-
-        logger.info("Collecting disk metrics (main thread)...") # LOG ADDED
-        self.metrics.disk = self._get_disk_metrics()
-        logger.info("Disk metrics collected.") # LOG ADDED
-
-        logger.info("Collecting network metrics (with local executor)...") # LOG ADDED
-        self.metrics.network = self._get_network_metrics() # Executor is created and used locally
-        logger.info("Network metrics collection initiated (speed test submitted to local executor).") # LOG ADDED
+        collectors = {
+            "system_info": self._get_system_info,
+            "cpu": lambda: self._get_cpu_metrics(interval=self.cpu_interval),
+            "memory": self._get_memory_metrics,
+            "disk": self._get_disk_metrics,
+            "network": self._get_network_metrics,
+            "gpu": self._get_gpu_metrics,
+            "processes": self._get_process_metrics,
+            "disk_usage": self._get_disk_usage
+        }
 
-        logger.info("Collecting GPU metrics (main thread)...") # LOG ADDED
-        self.metrics.gpu = self._get_gpu_metrics()
-        logger.info("GPU metrics collected.") # LOG ADDED
+        # Sampled readings are read from the latest snapshot instead of being probed again
+        snapshot = self.sampler.snapshot() if self.sampler else {}
+        for name in ("cpu", "memory", "disk", "network", "disk_usage"):
+            if name in snapshot:
+                setattr(self.metrics, name, snapshot[name])
+                del collectors[name]
+        if snapshot:
+            logger.info(f"Using sampled metrics from {time.time() - snapshot['timestamp']:.1f}s ago")
 
-        logger.info("Collecting process metrics (main thread)...") # LOG ADDED
-        self.metrics.processes = self._get_process_metrics()
-        logger.info("Process metrics collected.") # LOG ADDED
+        # Collectors that still run on demand run concurrently
+        logger.info(f"Collecting {', '.join(collectors)} concurrently...")
+        with ThreadPoolExecutor(max_workers=len(collectors)) as executor:
+            futures = {name: executor.submit(fn) for name, fn in collectors.items()}
+            for name, future in futures.items():
+                setattr(self.metrics, name, future.result())
 
-        logger.info("Metrics collection COMPLETED.") # LOG ADDED
+        logger.info("Metrics collection COMPLETED.")
 
 
     def generate_report(self):
@@ -254,10 +356,22 @@ class SystemHealthMonitor:
                 report_lines.append(f"- **{k}**: {v['used']:.1f}/{v['total']:.1f}GB ({v['percent_used']}%)")
         report_lines.append("")
 
+        # Disk Usage Breakdown (Markdown Section)
+        usage = self.metrics.disk_usage
+        if usage:
+            bound = "" if usage["complete"] else " (partial scan; sizes are lower bounds)"
+            report_lines.append(f"### Largest Directories in {usage['path']}{bound}") # Markdown Header 3
+            largest = heapq.nlargest(10, usage["children"].items(), key=lambda item: item[1])
+            for name, size in largest:
+                report_lines.append(f"- **{name}**: {size:.2f}GB")
+            report_lines.append("")
+
         # Network Metrics (Markdown Section)
         report_lines.append("### Network Metrics") # Markdown Header 3
         net_data = self.metrics.network
         report_lines.append(f"- **Status**: {net_data['status']}")
+        if net_data.get('probe_endpoint'):
+            report_lines.append(f"- **Reached**: {net_data['probe_endpoint']} in {net_data['probe_latency_ms']:.1f} ms")
         report_lines.append(f"- **Connections**: {net_data['connections']}")
         if net_data.get('speed_test'):
             report_lines.append(f"- **Download Speed**: {net_data['download']:.2f} Mbps")
@@ -289,41 +403,257 @@ class SystemHealthMonitor:
     def generate_visualizations(self):
         """Generate visualizations - No changes needed here for functionality"""
         # ... (rest of generate_visualizations - NO CHANGES NEEDED)
+        import matplotlib.pyplot as plt  # Plotting is only needed for the standalone report
+        self._plot_3d_disk()
         plt.tight_layout()
         plt.savefig("system_health_dashboard.png")
         print("[System dashboard saved as 'system_health_dashboard.png'](./system_health_dashboard.png)") # Markdown link here too
 
 
-    def _plot_3d_disk(self):
+    def _plot_3d_disk(self, top_n: int = 15):
         """3D disk visualization helper method"""
-        path = next(iter(self.metrics.disk))  # Get first disk
-        sizes, labels = [], []
-
-        try:
-            for entry in os.scandir(path):
-                if entry.is_dir():
-                    try:
-                        sizes.append(sum(f.stat().st_size for f in os.scandir(entry) if f.is_file()))
-                        labels.append(entry.name)
-                    except:
-                        continue
-        except Exception as e:
-            logger.error(f"Disk scan failed: {str(e)}")
-            return
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D  # This import registers the 3D projection
 
-        if not sizes:
+        usage = self.metrics.disk_usage
+        largest = heapq.nlargest(top_n, usage.get("children", {}).items(), key=lambda item: item[1])
+        if not largest:
             return
 
+        labels = [name for name, _ in largest]
+        sizes = [size for _, size in largest]
         x = np.arange(len(sizes))
-        ax = plt.gca()
+        ax = plt.figure(figsize=(10, 6)).add_subplot(projection='3d')
         ax.bar3d(x, np.zeros(len(sizes)), np.zeros(len(sizes)),
                 0.5, 0.5, sizes, shade=True)
         ax.set_xticks(x)
         ax.set_xticklabels([label[:10] for label in labels], rotation=45)
-        ax.set_title("3D Disk Usage Visualization")
+        ax.set_zlabel("GB")
+        ax.set_title(f"3D Disk Usage Visualization ({usage['path']})")
+
+class MetricsSampler:
+    """Background thread that keeps CPU, memory, disk and network readings fresh.
+
+    CPU usage is measured as the delta between consecutive samples, so no
+    reading ever blocks on ``cpu_percent(interval=1)``. Report generation
+    reads the latest snapshot through ``SystemHealthMonitor(sampler=...)``.
+    The directory breakdown is refreshed every ``disk_scan_interval``
+    seconds by one long-lived disk scanner, so each refresh re-lists only
+    directories that changed since the last one.
+    """
+
+    def __init__(self, interval: float = 5.0, history: Optional["MetricsHistory"] = None,
+                 disk_scan_interval: float = 300.0):
+        self.interval = interval
+        self.history = history
+        self.disk_scan_interval = disk_scan_interval
+        self._collector = SystemHealthMonitor(speed_test=False)
+        self.prober = self._collector.prober
+        self.connections = self._collector.connection_table  # Updated once per sample
+        self._disk_usage: Dict = {}
+        self._disk_scanned_at: Optional[float] = None
+        self._snapshot: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsSampler":
+        if self._thread and self._thread.is_alive():
+            return self
+        psutil.cpu_percent(interval=None)  # Prime the CPU delta
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        # First sample after a short window so the CPU delta is meaningful
+        wait = min(self.interval, 1.0)
+        while not self._stop.wait(wait):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Metrics sampling failed: {str(e)}")
+            wait = self.interval
+
+    def sample(self) -> Dict[str, Dict]:
+        """Take one reading of every sampled collector and publish it"""
+        snapshot = {
+            "timestamp": time.time(),
+            "cpu": self._collector._get_cpu_metrics(interval=None),
+            "memory": self._collector._get_memory_metrics(),
+            "disk": self._collector._get_disk_metrics(),
+            "network": self._collector._get_network_metrics(),
+            "disk_usage": self._sample_disk_usage()
+        }
+        if self.history is not None:
+            self.history.append(
+                snapshot,
+                psutil.net_io_counters(),
+                self._collector._get_process_metrics(top_n=self.history.top_n)
+            )
+        with self._lock:
+            self._snapshot = snapshot
+        self._ready.set()
+        return snapshot
+
+    def _sample_disk_usage(self) -> Dict:
+        """Latest directory breakdown, rescanning once it is ``disk_scan_interval`` old"""
+        now = time.monotonic()
+        if self._disk_scanned_at is None or now - self._disk_scanned_at >= self.disk_scan_interval:
+            self._disk_usage = self._collector._get_disk_usage()
+            self._disk_scanned_at = now
+        return self._disk_usage
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return dict(self._snapshot)
+
+class RemoteSampler:
+    """Reads the running app's latest sampler snapshot over HTTP.
+
+    Lets the chat intent script, which runs outside the app process, report
+    from background samples. Returns an empty snapshot when the app is
+    unreachable or its sample is older than ``max_age`` seconds, so
+    ``collect_metrics`` falls back to measuring directly.
+    """
+
+    def __init__(self, url: Optional[str] = None, timeout: float = 1.0, max_age: float = 60):
+        self.url = url or os.environ.get("HEALTH_METRICS_URL", "http://127.0.0.1:5000/api/metrics/latest")
+        self.timeout = timeout
+        self.max_age = max_age
+
+    def snapshot(self) -> Dict[str, Dict]:
+        try:
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+                snapshot = json.load(response)
+        except Exception as e:
+            logger.info(f"No sampled metrics from {self.url}: {str(e)}")
+            return {}
+        if not snapshot or time.time() - snapshot.get("timestamp", 0) > self.max_age:
+            return {}
+        return snapshot
+
+class MetricsHistory:
+    """Fixed-memory ring buffer of host metrics on preallocated NumPy arrays.
+
+    One row is written per sample; once ``capacity`` rows exist the oldest
+    row is overwritten, so memory stays constant however long it runs.
+    """
+
+    def __init__(self, capacity: int = 4320, top_n: int = 5):
+        self.capacity = capacity
+        self.top_n = top_n
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.cpu_percent = np.zeros(capacity, dtype=np.float32)
+        self.memory_percent = np.zeros(capacity, dtype=np.float32)
+        self.disk_percent = np.zeros(capacity, dtype=np.float32)
+        self.net_bytes_sent = np.zeros(capacity, dtype=np.float64)
+        self.net_bytes_recv = np.zeros(capacity, dtype=np.float64)
+        self.proc_pids = np.zeros((capacity, top_n), dtype=np.int64)
+        self.proc_cpu = np.zeros((capacity, top_n), dtype=np.float32)
+        self.proc_mem = np.zeros((capacity, top_n), dtype=np.float32)
+        self.proc_names = np.full((capacity, top_n), "", dtype=object)
+        self.proc_count = np.zeros(capacity, dtype=np.int8)
+        self.size = 0
+        self.head = 0  # Next row to write
+        self._lock = threading.Lock()
+
+    def append(self, snapshot: Dict, net_counters, processes: List[Dict]):
+        memory = snapshot["memory"]
+        disks = [d["percent_used"] for d in snapshot["disk"].values() if "percent_used" in d]
+        with self._lock:
+            i = self.head
+            self.timestamps[i] = snapshot["timestamp"]
+            self.cpu_percent[i] = snapshot["cpu"]["usage_percent"]
+            self.memory_percent[i] = 100.0 * memory["used"] / memory["total"] if memory["total"] else 0.0
+            self.disk_percent[i] = max(disks) if disks else 0.0
+            self.net_bytes_sent[i] = net_counters.bytes_sent
+            self.net_bytes_recv[i] = net_counters.bytes_recv
+            self.proc_pids[i] = 0
+            self.proc_cpu[i] = 0
+            self.proc_mem[i] = 0
+            self.proc_names[i] = ""
+            self.proc_count[i] = min(len(processes), self.top_n)
+            for j, proc in enumerate(processes[:self.top_n]):
+                self.proc_pids[i, j] = proc["pid"]
+                self.proc_cpu[i, j] = proc["cpu_percent"] or 0.0
+                self.proc_mem[i, j] = proc["memory_percent"] or 0.0
+                self.proc_names[i, j] = proc["name"] or ""
+            self.head = (i + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def _ordered(self) -> np.ndarray:
+        """Row indices from oldest to newest"""
+        start = (self.head - self.size) % self.capacity
+        return (start + np.arange(self.size)) % self.capacity
+
+    @staticmethod
+    def _bucket_mean(values: np.ndarray, starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        return np.add.reduceat(values, starts) / counts
+
+    def query(self, window: float = 3600, max_points: int = 300) -> Dict[str, list]:
+        """Return samples from the last ``window`` seconds, averaged down to at most ``max_points``"""
+        with self._lock:
+            rows = self._ordered()
+            rows = rows[self.timestamps[rows] >= time.time() - window]
+            ts = self.timestamps[rows]
+            cpu = self.cpu_percent[rows]
+            mem = self.memory_percent[rows]
+            disk = self.disk_percent[rows]
+            sent = self.net_bytes_sent[rows]
+            recv = self.net_bytes_recv[rows]
+            # Fancy indexing copies, so the process tables stay consistent after the lock is released
+            pids, pcpu, pmem = self.proc_pids[rows], self.proc_cpu[rows], self.proc_mem[rows]
+            pnames, pcount = self.proc_names[rows], self.proc_count[rows]
+        picks = np.arange(len(rows))
+
+        # Counters become per-second rates; the first sample has no previous reading
+        dt = np.diff(ts, prepend=ts[:1])
+        dt[dt <= 0] = np.nan
+        sent_bps = np.nan_to_num(np.clip(np.diff(sent, prepend=sent[:1]), 0, None) / dt)
+        recv_bps = np.nan_to_num(np.clip(np.diff(recv, prepend=recv[:1]), 0, None) / dt)
+
+        if len(rows) > max_points:
+            starts = np.linspace(0, len(rows), max_points, endpoint=False).astype(np.int64)
+            counts = np.diff(np.append(starts, len(rows)))
+            ts, cpu, mem, disk, sent_bps, recv_bps = (
+                self._bucket_mean(a.astype(np.float64), starts, counts)
+                for a in (ts, cpu, mem, disk, sent_bps, recv_bps)
+            )
+            picks = starts + counts - 1  # Process tables come from each bucket's last sample
+
+        return {
+            "timestamps": ts.tolist(),
+            "cpu_percent": np.round(cpu, 2).tolist(),
+            "memory_percent": np.round(mem, 2).tolist(),
+            "disk_percent": np.round(disk, 2).tolist(),
+            "net_sent_bps": np.round(sent_bps, 1).tolist(),
+            "net_recv_bps": np.round(recv_bps, 1).tolist(),
+            "top_processes": [
+                [
+                    {"pid": int(pids[r, j]), "name": pnames[r, j],
+                     "cpu_percent": float(pcpu[r, j]), "memory_percent": round(float(pmem[r, j]), 2)}
+                    for j in range(pcount[r])
+                ]
+                for r in picks
+            ]
+        }
 
 if __name__ == "__main__":
-    monitor = SystemHealthMonitor()
+    # Chat path: report from the app's background samples; without them, measure CPU over
+    # the process collector's window (which runs concurrently) and skip the speed test
+    monitor = SystemHealthMonitor(sampler=RemoteSampler(), speed_test=False,
+                                  cpu_interval=ProcessCollector().window)
     monitor.collect_metrics()
     monitor.generate_report()
     monitor.generate_visualizations()
\ No newline at end of file
@@ -1,8 +1,14 @@
 import psutil
 import os
 import subprocess
+import time
 from tkinter import messagebox
 
+try:
+    from scripts.disk_usage import DiskUsageScanner
+except ImportError:  # Run directly as scripts/system_optimizer.py
+    from disk_usage import DiskUsageScanner
+
 def optimize_system():
     results = []
     
@@ -14,11 +20,14 @@ def optimize_system():
     ]
     
     temp_folders = [folder for folder in temp_folders if folder and os.path.exists(folder)]
+    scanner = DiskUsageScanner()
+    # One budget shared by every before/after scan, well inside the script job timeout
+    scan_deadline = time.monotonic() + 20
     
     for folder in temp_folders:
         try:
             files = os.listdir(folder)
-            freed_space = sum(os.path.getsize(os.path.join(folder, f)) for f in files if os.path.exists(os.path.join(folder, f)))
+            before = scanner.scan(folder, time_budget=max(scan_deadline - time.monotonic(), 0))
             
             for f in files:
                 file_path = os.path.join(folder, f)
@@ -28,7 +37,14 @@ def optimize_system():
                     except PermissionError:
                         pass  # Ignore locked files
             
-            results.append(f"🧹 Cleared {freed_space//1024//1024}MB from {folder}")
+            # Recursive before/after totals, so only space actually released is reported
+            after = scanner.scan(folder, time_budget=max(scan_deadline - time.monotonic(), 0))
+            freed_space = max(before.size - after.size, 0)
+            if before.complete and after.complete:
+                results.append(f"🧹 Cleared {freed_space//1024//1024}MB from {folder}")
+            else:
+                results.append(f"🧹 Cleared files from {folder} (size scan incomplete; "
+                               f"about {freed_space//1024//1024}MB measured)")
         except Exception as e:
             results.append(f"⚠️ Error cleaning {folder}: {str(e)}")
 
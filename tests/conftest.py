@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Repo modules (chatbot/, scripts/) are imported from the project root, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,160 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from scripts.connectivity import ConnectivityProber, endpoints_from_env, DEFAULT_ENDPOINTS
+
+TIMEOUT = 0.5
+
+@pytest.fixture
+def listener():
+    """Accepting localhost listener; yields (endpoint, accepted connections)"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            accepted.append(conn)
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield server.getsockname(), accepted
+    server.close()
+    for conn in accepted:
+        conn.close()
+
+@pytest.fixture
+def refused():
+    """Port that is bound but not listening, so connects fail immediately"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    yield sock.getsockname()
+    sock.close()
+
+@pytest.fixture
+def blackhole():
+    """Listener that never accepts and whose backlog is full, so new connects hang until timeout"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(0)
+    fillers = []
+    for _ in range(8):
+        client = socket.socket()
+        client.settimeout(0.2)
+        try:
+            client.connect(server.getsockname())
+        except OSError:
+            client.close()
+            break
+        fillers.append(client)
+    else:
+        pytest.skip("kernel kept accepting into the backlog; cannot simulate a silent endpoint")
+    yield server.getsockname()
+    for client in fillers:
+        client.close()
+    server.close()
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def _label(endpoint):
+    return f"{endpoint[0]}:{endpoint[1]}"
+
+def test_returns_first_success_without_waiting_for_slow_endpoints(listener, blackhole):
+    endpoint, _ = listener
+    prober = ConnectivityProber([blackhole, endpoint], timeout=TIMEOUT)
+
+    start = time.monotonic()
+    result = prober.probe()
+
+    assert result.online
+    assert result.endpoint == _label(endpoint)
+    assert result.latency_ms is not None
+    assert time.monotonic() - start < TIMEOUT / 2
+
+def test_all_failing_endpoints_finish_within_one_timeout(blackhole, refused):
+    prober = ConnectivityProber([blackhole, blackhole, refused], timeout=TIMEOUT)
+
+    start = time.monotonic()
+    result = prober.probe()
+    elapsed = time.monotonic() - start
+
+    assert not result.online
+    assert prober.status() == "Offline"
+    # Sequential dialling would take at least two timeouts
+    assert elapsed < TIMEOUT * 1.5
+
+def test_result_is_cached_for_ttl(listener):
+    endpoint, _ = listener
+    prober = ConnectivityProber([endpoint], timeout=TIMEOUT, ttl=0.3)
+    label = _label(endpoint)
+
+    first = prober.probe()
+    assert prober.probe() is first
+    assert sum(prober.stats()["endpoints"][label]["histogram"]) == 1
+
+    assert prober.probe(force=True) is not first
+    time.sleep(0.35)
+    prober.probe()
+    assert sum(prober.stats()["endpoints"][label]["histogram"]) == 3
+
+def test_concurrent_callers_share_one_probe(listener):
+    endpoint, _ = listener
+    prober = ConnectivityProber([endpoint], timeout=TIMEOUT, ttl=10)
+    results = []
+    barrier = threading.Barrier(8)
+
+    def call():
+        barrier.wait()
+        results.append(prober.probe())
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(r) for r in results}) == 1
+    assert sum(prober.stats()["endpoints"][_label(endpoint)]["histogram"]) == 1
+
+def test_probe_closes_its_sockets(listener):
+    endpoint, accepted = listener
+    prober = ConnectivityProber([endpoint], timeout=TIMEOUT)
+
+    assert prober.probe().online
+    assert _wait_for(lambda: accepted)
+    conn = accepted[0]
+    conn.settimeout(1.0)
+    assert conn.recv(1) == b""  # Peer closed the connection
+
+def test_histograms_and_failure_counts(listener, refused):
+    endpoint, _ = listener
+    prober = ConnectivityProber([refused, endpoint], timeout=TIMEOUT)
+
+    assert prober.probe().online
+    assert _wait_for(lambda: prober.stats()["endpoints"][_label(refused)]["failures"] == 1)
+
+    stats = prober.stats()
+    assert len(stats["buckets_ms"]) == len(stats["endpoints"][_label(endpoint)]["histogram"])
+    assert stats["endpoints"][_label(endpoint)]["histogram"][0] == 1  # Localhost is under 5 ms
+    assert stats["endpoints"][_label(endpoint)]["failures"] == 0
+    assert sum(stats["endpoints"][_label(refused)]["histogram"]) == 0
+    assert stats["last"]["endpoint"] == _label(endpoint)
+
+def test_endpoints_from_env(monkeypatch):
+    monkeypatch.setenv("CONNECTIVITY_ENDPOINTS", "127.0.0.1:80, [::1]:443, bogus")
+    assert endpoints_from_env() == (("127.0.0.1", 80), ("::1", 443))
+    monkeypatch.setenv("CONNECTIVITY_ENDPOINTS", "")
+    assert endpoints_from_env() == DEFAULT_ENDPOINTS
@@ -0,0 +1,32 @@
+import numpy as np
+
+from chatbot.embedding_store import EmbeddingStore
+from chatbot.startup import process_context
+
+MODEL = "test/model"
+DIM = 8
+
+def _vector(text):
+    return np.full(DIM, sum(map(ord, text)), dtype=np.float32)
+
+def _writer(root, worker, rounds):
+    store = EmbeddingStore(root, MODEL)  # Index loaded once, so it goes stale as the others flush
+    for i in range(rounds):
+        for text in (f"shared {i}", f"worker {worker} text {i}"):
+            store.add(text, _vector(text))
+        store.flush()
+
+def test_concurrent_flushes_keep_every_row_aligned(tmp_path):
+    ctx = process_context()
+    workers = [ctx.Process(target=_writer, args=(str(tmp_path), w, 20)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    store = EmbeddingStore(str(tmp_path), MODEL)
+    texts = [f"shared {i}" for i in range(20)] + [f"worker {w} text {i}" for w in range(4) for i in range(20)]
+    assert len(store.index) == len(texts)  # Shared texts are stored once
+    for text in texts:
+        np.testing.assert_array_equal(store.get(text), _vector(text))
@@ -0,0 +1,43 @@
+import pytest
+
+from chatbot.jobs import ScriptJobQueue
+from chatbot.worker_pool import ScriptWorkerPool
+
+@pytest.fixture
+def slow_script(tmp_path):
+    path = tmp_path / "slow.py"
+    path.write_text("import time\nprint('started', flush=True)\ntime.sleep(30)\n")
+    return str(path)
+
+def _timed_out_job_frees_its_slot(queue, script):
+    job = queue.submit(script)
+    assert job.wait(20)
+    assert job.status == "timeout"
+    # Resubmitting as soon as the job reports done must not hit the per-script limit
+    retry = queue.submit(script)
+    queue.cancel(retry.id)
+    assert retry.wait(20)
+
+def test_subprocess_slot_is_free_when_job_is_done(slow_script):
+    queue = ScriptJobQueue(timeout=1, script_limits={slow_script: 1})
+    _timed_out_job_frees_its_slot(queue, slow_script)
+
+def test_worker_pool_slot_is_free_when_job_is_done(slow_script):
+    pool = ScriptWorkerPool([slow_script], size=1, prewarm=())
+    try:
+        queue = ScriptJobQueue(timeout=1, script_limits={slow_script: 1}, pool=pool)
+        _timed_out_job_frees_its_slot(queue, slow_script)
+    finally:
+        pool.close()
+
+def test_respond_rewrites_the_result_before_done(tmp_path):
+    script = tmp_path / "hello.py"
+    script.write_text("print('raw output')\n")
+    queue = ScriptJobQueue(timeout=10)
+
+    job = queue.submit(str(script), respond=str.upper)
+
+    assert job.wait(20)
+    assert job.status == "succeeded"
+    assert job.result_text() == "RAW OUTPUT"
+    assert job.to_dict()["response"] == "RAW OUTPUT"